@@ -2,13 +2,18 @@ import concurrent.futures
 import json
 import logging
 import os
+import queue
 import threading
 import time
 
-from PBTFactory.chat import RequestManager
+from PBTFactory.chat import RequestManager, RequestType
 from PBTFactory.cut_data import CUT_data
-from PBTFactory.pipeline import IPipeline
+from PBTFactory.error_triage import summarize_triage
+from PBTFactory.explanation_cache import get_cache_tag
+from PBTFactory.mutant_baseline import get_or_create_baseline
+from PBTFactory.pipeline import IPipeline, Pipeline
 from PBTFactory.pipeline_factory import PipelineFactory
+from PBTFactory.strategy_store import HIT, INVALID, MISS, summarize_store
 from PBTFactory.summary import summary
 
 logging.basicConfig(
@@ -20,23 +25,90 @@ logging.getLogger("openai").setLevel(logging.ERROR)
 logging.getLogger("httpx").setLevel(logging.ERROR)
 
 
-def run(cut_data: CUT_data, pipeline_factory: PipelineFactory):
-    timeused = 0
+class StageStats:
+    """Busy time of the workers of one stage, to report its utilisation."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, timeused: float):
+        with self._lock:
+            self.busy += timeused
+            self.count += 1
+
+    def __str__(self):
+        return f"{self.name}: {self.count} done, busy {self.busy:.0f}s"
+
+    def utilisation(self, wall_time: float) -> float:
+        if wall_time <= 0:
+            return 0.0
+        return self.busy / (self.workers * wall_time)
+
+
+def generate(
+    cut_data: CUT_data,
+    pipeline_factory: PipelineFactory,
+    eval_queue: queue.Queue,
+    stats: StageStats,
+):
+    """
+    Generation stage, bound by the LLM servers. The pipeline is handed to the
+    evaluation stage through eval_queue, put() blocks while the queue is full.
+    """
     try:
         pipeline: IPipeline = pipeline_factory.create(cut_data)
-        if not pipeline.have_finished():
-            timeused = pipeline.run()
-            result = pipeline.eval_test()
-        else:
+        if pipeline.have_finished():
             with open(
                 os.path.join(cut_data.resultdir, "parsed_report.json"),
             ) as f:
-                result = json.load(f)
+                return json.load(f)
+        t0 = time.time()
+        pipeline.run()
+        stats.add(time.time() - t0)
     except Exception as e:
         logging.error(f"Error creating or running pipeline:\n{e}", exc_info=True)
         raise e
-    # result["timeused"] = timeused
-    return result
+    eval_queue.put(pipeline)
+    return None
+
+
+def evaluate(eval_queue: queue.Queue, results: list, stats: StageStats, verbose):
+    """Evaluation stage, bound by CPU cores. Stops on a None item."""
+    while True:
+        pipeline = eval_queue.get()
+        if pipeline is None:
+            return
+        t0 = time.time()
+        try:
+            result = pipeline.eval_test()
+            if verbose:
+                print(result)
+            results.append(result)
+        except Exception as e:
+            logging.error(f"Error evaluating pipeline:\n{e}", exc_info=True)
+        finally:
+            stats.add(time.time() - t0)
+
+
+def precompute_baselines(args, list_of_cut_data: list[CUT_data]):
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=args.max_workers
+    ) as executor:
+        futures = [
+            executor.submit(
+                get_or_create_baseline, cut_data, args.baseline_dir, args.given_tests
+            )
+            for cut_data in list_of_cut_data
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error creating mutant baseline:\n{e}")
 
 
 def main(args, list_of_cut_data: list[CUT_data]):
@@ -47,8 +119,12 @@ def main(args, list_of_cut_data: list[CUT_data]):
         f"Pipeline: {args.pipeline}. Model: {', '.join([llm_server['model'] for llm_server in args.llm_server_configs.values()])}"
     )
 
+    if args.baseline_dir and args.given_tests:
+        precompute_baselines(args, list_of_cut_data)
+
     RequestManager.init(config={"llm_servers": args.llm_server_configs.values()})
     RequestManager().verbose = args.verbose
+    RequestManager().max_continuations = args.max_continuations
 
     factory = PipelineFactory(
         args.pipeline,
@@ -58,29 +134,106 @@ def main(args, list_of_cut_data: list[CUT_data]):
             "max_strategy_retry": args.max_strategy_retry,
             "max_strategy_fix": args.max_strategy_fix,
             "max_hypothesis_examples": args.max_hypothesis_examples,
+            "eval_hypothesis_examples": args.eval_hypothesis_examples,
+            "eval_hypothesis_shrink": args.eval_hypothesis_shrink,
+            "test_order": args.test_order,
+            "kill_history_dir": args.kill_history_dir,
+            "baseline_dir": args.baseline_dir,
+            "eval_tmpfs_mb": args.eval_tmpfs_mb,
+            "incremental_eval": args.incremental_eval,
+            "early_stop_score": args.early_stop_score,
+            "adaptive_timeouts": args.adaptive_timeouts,
+            "dedup_tests": args.dedup_tests,
+            "kill_matrix": args.kill_matrix,
+            "static_check": args.static_check,
+            "auto_repair": args.auto_repair,
+            "triage_policy": args.triage_policy,
+            "fix_error_tokens": args.fix_error_tokens,
+            "batch_property_check": args.batch_property_check,
+            "strategy_synthesis": args.strategy_synthesis,
+            "strategy_store_dir": args.strategy_store_dir,
+            "explanation_cache": args.explanation_cache,
+            "explanation_cache_dir": args.explanation_cache_dir,
+            "explanation_cache_tag": get_cache_tag(
+                [
+                    llm_server["model"]
+                    for llm_server in args.llm_server_configs.values()
+                    if RequestType.long_answer in llm_server["allow_request_type"]
+                ],
+                args.explanation_cache,
+                os.path.basename(os.path.normpath(args.out or "")),
+            ),
             "system_message": args.system_message,
         },
     )
 
+    results = []
+    eval_queue = queue.Queue(maxsize=args.eval_queue_size)
+    generation_stats = StageStats("generation", args.max_workers)
+    evaluation_stats = StageStats("evaluation", args.max_eval_workers)
+    t0 = time.time()
+
+    eval_threads = [
+        threading.Thread(
+            target=evaluate,
+            args=(eval_queue, results, evaluation_stats, args.verbose),
+        )
+        for _ in range(args.max_eval_workers)
+    ]
+    for thread in eval_threads:
+        thread.start()
+    if args.incremental_eval:
+        # streamed evaluations run beside the generation, see Pipeline.stream_eval
+        Pipeline.stream_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=args.max_eval_workers
+        )
+
     with concurrent.futures.ThreadPoolExecutor(
         max_workers=args.max_workers
     ) as executor:
-        results = []
         futures = [
-            executor.submit(run, cut_data, factory) for cut_data in list_of_cut_data
+            executor.submit(generate, cut_data, factory, eval_queue, generation_stats)
+            for cut_data in list_of_cut_data
         ]
 
         for future in concurrent.futures.as_completed(futures):
             try:
                 result = future.result()
-                if args.verbose:
-                    print(result)
-                results.append(result)
+                if result is not None:
+                    if args.verbose:
+                        print(result)
+                    results.append(result)
             except Exception as e:
                 logging.error(f"Error:\n{e}")
 
         RequestManager().stop = True
 
+    for _ in eval_threads:
+        eval_queue.put(None)
+    for thread in eval_threads:
+        thread.join()
+    if Pipeline.stream_executor is not None:
+        Pipeline.stream_executor.shutdown()
+
+    wall_time = time.time() - t0
+    for stats in [generation_stats, evaluation_stats]:
+        logging.info(
+            f"{stats}, utilisation {stats.utilisation(wall_time) * 100:.1f}% over {wall_time:.0f}s"
+        )
+
+    if args.triage_policy != "off":
+        triage = summarize_triage([cut_data.logdir for cut_data in list_of_cut_data])
+        for name, counts in triage.items():
+            logging.info(
+                f"Triage {name}: {counts.get('abandoned', 0)}/{counts.get('properties', 0)} abandoned ({counts['abandon_rate'] * 100:.1f}%), {counts.get('llm_calls_saved', 0)} LLM calls saved"
+            )
+
+    if args.strategy_store_dir:
+        store = summarize_store([cut_data.logdir for cut_data in list_of_cut_data])
+        logging.info(
+            f"Strategy store: {store[HIT]} hits, {store[MISS]} misses, {store[INVALID]} invalid, {store['stored']} stored"
+        )
+
     summary_result = summary(results)
     print(summary_result)
     for result in results:
@@ -0,0 +1,235 @@
+import ast
+import sys
+import typing
+
+from PBTFactory.error_triage import (
+    ASSERTION,
+    HEALTH_CHECK,
+    MODULE_NOT_FOUND,
+    NAME_ERROR,
+    TestFailure,
+    get_close_float_assertions,
+)
+from PBTFactory.message import replace_lines
+from PBTFactory.static_check import get_module_exports
+
+HYPOTHESIS_NAMES = {
+    "given",
+    "settings",
+    "assume",
+    "example",
+    "note",
+    "event",
+    "target",
+    "reject",
+    "HealthCheck",
+    "Phase",
+    "Verbosity",
+}
+KNOWN_IMPORTS = {
+    "st": "import hypothesis.strategies as st",
+    "strategies": "from hypothesis import strategies",
+    "hypothesis": "import hypothesis",
+    "pytest": "import pytest",
+    "np": "import numpy as np",
+}
+
+
+def add_import(code, tree: ast.Module, statement) -> str:
+    """Insert an import statement after `from __future__` imports."""
+    position = 0
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module == "__future__":
+            position = node.end_lineno
+    lines = code.split("\n")
+    lines.insert(position, statement)
+    return "\n".join(lines)
+
+
+def get_import_for(name, module, exports) -> str:
+    if name in KNOWN_IMPORTS:
+        return KNOWN_IMPORTS[name]
+    if name in HYPOTHESIS_NAMES:
+        return f"from hypothesis import {name}"
+    if exports and name in exports:
+        return f"from {module} import {name}"
+    if name in sys.stdlib_module_names:
+        return f"import {name}"
+    if not name.startswith("_") and hasattr(typing, name):
+        return f"from typing import {name}"
+    return ""
+
+
+def repair_name_error(code, tree, failure: TestFailure, logs_err, module, exports):
+    statement = get_import_for(failure.name, module, exports)
+    if not statement:
+        return None, ""
+    return add_import(code, tree, statement), f"Added `{statement}`"
+
+
+def repair_module_not_found(
+    code, tree, failure: TestFailure, logs_err, module, exports
+):
+    """
+    Import the names the CUT module defines from it, and remove imports from the
+    missing module that are not used.
+    """
+    missing = failure.name.split(".")[0]
+    used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)}
+    used |= {
+        n.value.id
+        for n in ast.walk(tree)
+        if isinstance(n, ast.Attribute) and isinstance(n.value, ast.Name)
+    }
+    lines = code.split("\n")
+    edits = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            if node.module.split(".")[0] != missing:
+                continue
+            names = [a.asname or a.name for a in node.names]
+            if exports and all(a.name in exports for a in node.names):
+                new = ast.unparse(ast.ImportFrom(module, node.names, 0))
+            elif not set(names) & used:
+                new = ""
+            else:
+                return None, ""
+        elif isinstance(node, ast.Import):
+            aliases = [a for a in node.names if a.name.split(".")[0] == missing]
+            if not aliases:
+                continue
+            if {a.asname or a.name.split(".")[0] for a in aliases} & used:
+                return None, ""
+            kept = [a for a in node.names if a not in aliases]
+            new = ast.unparse(ast.Import(kept)) if kept else ""
+        else:
+            continue
+        indent = lines[node.lineno - 1][: node.col_offset]
+        if not new and indent:
+            new = "pass"
+        edits.append((node.lineno, node.end_lineno, [indent + new] if new else []))
+    if not edits:
+        return None, ""
+    return replace_lines(code, edits), f"Fixed the imports from `{missing}`"
+
+
+def is_given(decorator) -> bool:
+    func = decorator.func if isinstance(decorator, ast.Call) else decorator
+    return getattr(func, "id", getattr(func, "attr", "")) == "given"
+
+
+def repair_health_check(code, tree, failure: TestFailure, logs_err, module, exports):
+    """Suppress the failed health check on every test decorated with @given."""
+    if not failure.name:
+        return None, ""
+    check = ast.parse(f"HealthCheck.{failure.name}", mode="eval").body
+    lines = code.split("\n")
+    edits = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        if not any(is_given(d) for d in node.decorator_list):
+            continue
+        settings = None
+        for d in node.decorator_list:
+            if isinstance(d, ast.Call) and getattr(d.func, "id", "") == "settings":
+                settings = d
+        indent = lines[node.lineno - 1][: node.col_offset]
+        if settings is None:
+            new = (
+                f"{indent}@settings(suppress_health_check=[HealthCheck.{failure.name}])"
+            )
+            first = node.decorator_list[0].lineno
+            edits.append((first, first - 1, [new]))
+            continue
+        keyword = next(
+            (k for k in settings.keywords if k.arg == "suppress_health_check"), None
+        )
+        if keyword is None:
+            keyword = ast.keyword("suppress_health_check", ast.List([], ast.Load()))
+            settings.keywords.append(keyword)
+        if not isinstance(keyword.value, (ast.List, ast.Tuple)):
+            return None, ""
+        if any(ast.dump(e) == ast.dump(check) for e in keyword.value.elts):
+            return None, ""
+        keyword.value = ast.List(list(keyword.value.elts) + [check], ast.Load())
+        edits.append(
+            (
+                settings.lineno,
+                settings.end_lineno,
+                [f"{indent}@{ast.unparse(settings)}"],
+            )
+        )
+    if not edits:
+        return None, ""
+    code = replace_lines(code, edits)
+    for name in ["HealthCheck", "settings"]:
+        if not defines_name(tree, name):
+            code = add_import(code, ast.parse(code), f"from hypothesis import {name}")
+    return code, f"Suppressed HealthCheck.{failure.name}"
+
+
+def defines_name(tree, name) -> bool:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if any((a.asname or a.name.split(".")[0]) == name for a in node.names):
+                return True
+    return False
+
+
+def repair_float_equality(code, tree, failure: TestFailure, logs_err, module, exports):
+    statements = get_close_float_assertions(logs_err)
+    if not statements:
+        return None, ""
+    lines = code.split("\n")
+    edits = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Assert) or not isinstance(node.test, ast.Compare):
+            continue
+        if len(node.test.ops) != 1 or not isinstance(node.test.ops[0], ast.Eq):
+            continue
+        if lines[node.lineno - 1].strip() not in statements:
+            continue
+        isclose = ast.parse(
+            "math.isclose(a, b, rel_tol=1e-3, abs_tol=1e-3)", mode="eval"
+        ).body
+        isclose.args = [node.test.left, node.test.comparators[0]]
+        node.test = isclose
+        indent = lines[node.lineno - 1][: node.col_offset]
+        edits.append((node.lineno, node.end_lineno, [indent + ast.unparse(node)]))
+    if not edits:
+        return None, ""
+    code = replace_lines(code, edits)
+    if not defines_name(tree, "math"):
+        code = add_import(code, ast.parse(code), "import math")
+    return code, "Compared floats with math.isclose"
+
+
+REPAIRS = {
+    NAME_ERROR: repair_name_error,
+    MODULE_NOT_FOUND: repair_module_not_found,
+    HEALTH_CHECK: repair_health_check,
+    ASSERTION: repair_float_equality,
+}
+
+
+def repair_code(
+    code, failure: TestFailure, logs_err, module, project_path
+) -> typing.Tuple[typing.Optional[str], str]:
+    """
+    Deterministic rewrite of generated code for mechanical errors. Returns the
+    repaired code and a description, or (None, "") if no rule applies.
+    """
+    if failure.category not in REPAIRS:
+        return None, ""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None, ""
+    exports = get_module_exports(project_path, module)
+    repaired, description = REPAIRS[failure.category](
+        code, tree, failure, logs_err, module, exports
+    )
+    if repaired is None or repaired == code:
+        return None, ""
+    return repaired, description
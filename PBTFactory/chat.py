@@ -1,20 +1,24 @@
+import logging
 import os
 import threading
 import time
 import typing as T
 import uuid
 
+from PBTFactory.context_budget import fit_messages
 from PBTFactory.message import MessageManager
 from PBTFactory.request_manager import RequestManager, RequestType
+from PBTFactory.structured_output import create_fix_json_prompt, parse_structured
 
 
 class Chat:
     _lock: threading.Lock
     _msgs: T.Dict[uuid.UUID, T.Tuple[str, float]]
 
-    def __init__(self, save_folder, system_message=None):
+    def __init__(self, save_folder, system_message=None, test_context=""):
         self.save_folder = save_folder
         self.system_message = system_message
+        self.test_context = test_context
         self.msg_count = 0
         self.total_time = 0
         self._msgs = {}
@@ -25,11 +29,58 @@ class Chat:
             self._msgs[id] = (msg, timeused)
             self.total_time += timeused
 
+    def fit_to_context(self, messages, step_name, request_type: RequestType):
+        """Trim the prompt to the context window of the servers, see fit_messages."""
+        budget = RequestManager().get_prompt_budget(request_type)
+        if budget is None:
+            return messages
+        messages, trims = fit_messages(messages, budget, self.test_context)
+        if trims:
+            with open(os.path.join(self.save_folder, "context_budget.log"), "a") as f:
+                for trim in trims:
+                    f.write(f"{self.msg_count}_{step_name}: {trim}\n")
+            logging.info(
+                f"Trimmed prompt {self.save_folder}_{self.msg_count}: {'; '.join(trims)}"
+            )
+        return messages
+
     def ask(
         self,
         message_manager: MessageManager,
         step_name=None,
         request_type: RequestType = RequestType.long_answer,
+        output_schema=None,
+        validation_schema=None,
+    ):
+        """
+        Send the messages and wait for the answer. With output_schema, the answer
+        is JSON that follows the schema: servers that support it constrain their
+        output to it, and the answer is validated here, with one retry that shows
+        the errors. The data is returned then, None if the answer is not valid.
+        validation_schema replaces output_schema in the validation, e.g. a looser
+        one when the caller skips invalid items itself.
+        """
+        msg = self._request(message_manager, step_name, request_type, output_schema)
+        if output_schema is None:
+            return msg
+        validation_schema = validation_schema or output_schema
+        data, errors = parse_structured(msg, validation_schema)
+        if errors:
+            retry_mm = message_manager.copy()
+            retry_mm.add_assistant_message(msg)
+            retry_mm.add_user_message(create_fix_json_prompt(errors, output_schema))
+            msg = self._request(
+                retry_mm, f"{step_name}_json", request_type, output_schema
+            )
+            data, errors = parse_structured(msg, validation_schema)
+        return data
+
+    def _request(
+        self,
+        message_manager: MessageManager,
+        step_name,
+        request_type: RequestType,
+        output_schema,
     ):
         id = uuid.uuid4()
         if self.system_message:
@@ -38,12 +89,14 @@ class Chat:
             ] + message_manager.messages
         else:
             messages = message_manager.messages
+        messages = self.fit_to_context(messages, step_name, request_type)
 
         request = {
             "id": id,
             "messages": messages,
             "callback": self._on_response,
             "info": f"{step_name}\t{self.save_folder}_{self.msg_count}",
+            "output_schema": output_schema,
         }
         RequestManager().add(request, self.save_folder, request_type)
 
@@ -0,0 +1,60 @@
+import threading
+import typing as T
+
+from PBTFactory.cut_data import CUT_data
+
+
+class ClassGroup:
+    """
+    Methods of one class that are processed as a unit: the explanation of the
+    class and the strategy that constructs its instances are created by the
+    first member that needs them and shared with the others. The lock is only
+    held to claim that work, the other members wait for `prepared`.
+    """
+
+    def __init__(self, module: str, classname: str, members: T.List[CUT_data]):
+        self.module = module
+        self.classname = classname
+        self.members = members
+        self.lock = threading.Lock()
+        self.claimed = False
+        self.prepared = threading.Event()
+        self.explanation = None
+        self.instance_strategy = None  # "" if it could not be created
+
+    def claim(self) -> bool:
+        """True for the first member only, it prepares the group."""
+        with self.lock:
+            claimed = self.claimed
+            self.claimed = True
+        return not claimed
+
+    def __str__(self):
+        return f"{self.module}.{self.classname}"
+
+
+def get_classname(cut_data: CUT_data) -> str:
+    """The class of a method, "" for module level functions."""
+    if "." not in cut_data.cut.entry_point:
+        return ""
+    return cut_data.cut.entry_point.split(".")[0]
+
+
+def group_by_class(list_of_cut_data: T.List[CUT_data]) -> T.List[ClassGroup]:
+    """Group the methods of classes with more than one method under test."""
+    members = {}
+    for cut_data in list_of_cut_data:
+        classname = get_classname(cut_data)
+        if classname:
+            key = (cut_data.cut.module, classname)
+            members.setdefault(key, []).append(cut_data)
+
+    groups = []
+    for (module, classname), cut_datas in members.items():
+        if len(cut_datas) < 2:
+            continue
+        group = ClassGroup(module, classname, cut_datas)
+        for cut_data in cut_datas:
+            cut_data.group = group
+        groups.append(group)
+    return groups
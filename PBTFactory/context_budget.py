@@ -0,0 +1,71 @@
+import typing as T
+
+from PBTFactory.tokens import count_message_tokens, count_tokens, truncate_to_tokens
+
+# Start of the prompt of Pipeline.ask_fix_code
+FIX_PROMPT_START = "Fix the error in the code."
+
+
+def is_fix_prompt(message) -> bool:
+    return message["role"] == "user" and message["content"].startswith(FIX_PROMPT_START)
+
+
+def drop_old_fix_turn(messages) -> T.Optional[list]:
+    """
+    Remove the oldest fix turn that is not the last one: the answer with the
+    failing code and the fix prompt with its error. The answer to the fix prompt
+    takes the place of the removed answer. None if there is no such turn.
+    """
+    for i in range(1, len(messages) - 1):
+        if is_fix_prompt(messages[i]) and messages[i - 1]["role"] == "assistant":
+            if not any(is_fix_prompt(m) for m in messages[i + 1 :]):
+                return None
+            return messages[: i - 1] + messages[i + 1 :]
+    return None
+
+
+def shorten_test_context(messages, test_context, max_tokens) -> list:
+    """Replace the tests in the messages by a truncated version of max_tokens."""
+    if max_tokens > 0:
+        shortened = truncate_to_tokens(test_context, max_tokens)
+    else:
+        shortened = "# tests omitted"
+    return [
+        {**m, "content": m["content"].replace(test_context, shortened)}
+        for m in messages
+    ]
+
+
+def fit_messages(messages, max_tokens, test_context="") -> T.Tuple[list, T.List[str]]:
+    """
+    Trim the messages to max_tokens prompt tokens, lowest priority first: old
+    fix turns, then the existing tests given as context. The task and the last
+    turn are kept, the prompt can stay over the budget if they do not fit.
+    Returns the messages and a description of each trim.
+    """
+    trims = []
+    tokens = count_message_tokens(messages)
+    while tokens > max_tokens:
+        trimmed = drop_old_fix_turn(messages)
+        if trimmed is None:
+            break
+        new_tokens = count_message_tokens(trimmed)
+        trims.append(f"Dropped an old fix turn ({tokens - new_tokens} tokens)")
+        messages, tokens = trimmed, new_tokens
+
+    if tokens > max_tokens and test_context.strip():
+        occurrences = sum(m["content"].count(test_context) for m in messages)
+        if occurrences:
+            test_tokens = count_tokens(test_context)
+            excess = tokens - max_tokens
+            budget = test_tokens - (excess + occurrences - 1) // occurrences
+            messages = shorten_test_context(messages, test_context, budget)
+            new_tokens = count_message_tokens(messages)
+            trims.append(
+                f"Shortened the test context from {test_tokens} to {max(budget, 0)} tokens ({tokens - new_tokens} tokens)"
+            )
+            tokens = new_tokens
+
+    if tokens > max_tokens:
+        trims.append(f"Prompt still exceeds the budget: {tokens} > {max_tokens} tokens")
+    return messages, trims
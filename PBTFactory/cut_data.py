@@ -1,3 +1,4 @@
+import typing as T
 from dataclasses import dataclass
 
 from PBTFactory.code_under_test import code_under_test
@@ -10,3 +11,4 @@ class CUT_data:
     testdir: str
     resultdir: str
     logdir: str
+    group: T.Any = None  # ClassGroup of the method, see class_group.py
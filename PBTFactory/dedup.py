@@ -0,0 +1,225 @@
+import ast
+import copy
+import hashlib
+import os
+import shutil
+import typing as T
+
+from PBTFactory.message import replace_lines
+
+FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def get_bound_names(function) -> set:
+    """Parameters and names assigned in a function."""
+    args = function.args
+    names = {
+        a.arg
+        for a in args.posonlyargs
+        + args.args
+        + args.kwonlyargs
+        + [args.vararg, args.kwarg]
+        if a is not None
+    }
+    for node in ast.walk(function):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+    return names
+
+
+def get_module_bindings(tree) -> T.Dict[str, T.List[ast.AST]]:
+    """
+    Statements of a module that bind each name: helper functions, classes,
+    assignments and imports. Tests are left out.
+    """
+    bindings = {}
+    for node in tree.body:
+        names = []
+        if isinstance(node, FUNCTION_TYPES):
+            if not node.name.startswith("test"):
+                names = [node.name]
+        elif isinstance(node, ast.ClassDef):
+            names = [node.name]
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = [
+                n.id
+                for target in targets
+                for n in ast.walk(target)
+                if isinstance(n, ast.Name)
+            ]
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [
+                alias.asname or alias.name.split(".")[0]
+                for alias in node.names
+                if alias.name != "*"
+            ]
+        for name in names:
+            bindings.setdefault(name, []).append(node)
+    return bindings
+
+
+def normalize_binding(name, bindings, inlined) -> str:
+    """The code that binds a module level name, with the names it uses inlined."""
+    inlined = inlined | {name}
+    parts = []
+    for node in bindings[name]:
+        if isinstance(node, FUNCTION_TYPES):
+            parts.append(normalize_function(node, bindings, inlined))
+        else:
+            node = Normalizer(set(), bindings, inlined).visit(copy.deepcopy(node))
+            parts.append(ast.dump(node, annotate_fields=False))
+    return "".join(parts)
+
+
+class Normalizer(ast.NodeTransformer):
+    """
+    Rename the local names of a function by order of appearance and replace
+    the module level names it uses, e.g. strategy_function, strategies assigned
+    to variables or imports, by the code that binds them.
+    """
+
+    def __init__(self, local_names, bindings, inlined):
+        self.local_names = local_names
+        self.bindings = bindings
+        self.inlined = inlined
+        self.names = {}
+
+    def rename(self, name):
+        if name not in self.names:
+            self.names[name] = f"v{len(self.names)}"
+        return self.names[name]
+
+    def visit_Name(self, node):
+        if node.id in self.local_names:
+            return ast.copy_location(ast.Name(self.rename(node.id), node.ctx), node)
+        if node.id in self.bindings and node.id not in self.inlined:
+            code = normalize_binding(node.id, self.bindings, self.inlined)
+            return ast.copy_location(ast.Constant(code), node)
+        return node
+
+    def visit_arg(self, node):
+        if node.arg in self.local_names:
+            node.arg = self.rename(node.arg)
+        node.annotation = None
+        return node
+
+    def visit_ExceptHandler(self, node):
+        if node.name in self.local_names:
+            node.name = self.rename(node.name)
+        return self.generic_visit(node)
+
+
+def normalize_function(function, bindings, inlined=frozenset()) -> str:
+    """The AST of a function without its name, docstring and local names."""
+    name = function.name
+    function = copy.deepcopy(function)
+    function.name = "_"
+    function.returns = None
+    if ast.get_docstring(function, clean=False) is not None:
+        function.body = function.body[1:] or [ast.Pass()]
+    normalizer = Normalizer(get_bound_names(function), bindings, inlined | {name})
+    return ast.dump(normalizer.visit(function), annotate_fields=False)
+
+
+def get_tests(tree) -> T.List[T.Tuple[T.Optional[ast.ClassDef], ast.AST]]:
+    """Test functions of a module and test methods of its classes."""
+    tests = []
+    for node in tree.body:
+        if isinstance(node, FUNCTION_TYPES) and node.name.startswith("test"):
+            tests.append((None, node))
+        elif isinstance(node, ast.ClassDef):
+            for method in node.body:
+                if isinstance(method, FUNCTION_TYPES) and method.name.startswith(
+                    "test"
+                ):
+                    tests.append((node, method))
+    return tests
+
+
+def get_class_context(cls, bindings) -> str:
+    """Bases, attributes and helper methods (e.g. setUp) of a test class."""
+    parts = []
+    for node in cls.bases + cls.body:
+        if isinstance(node, FUNCTION_TYPES):
+            if not node.name.startswith("test"):
+                parts.append(normalize_function(node, bindings))
+            continue
+        node = Normalizer(set(), bindings, frozenset()).visit(copy.deepcopy(node))
+        parts.append(ast.dump(node, annotate_fields=False))
+    return "".join(parts)
+
+
+def get_test_key(cls, function, bindings) -> str:
+    code = normalize_function(function, bindings)
+    if cls is not None:
+        # methods can use the fixtures of their class, they only match with it
+        code = get_class_context(cls, bindings) + code
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def get_start_line(node) -> int:
+    return min([node.lineno] + [d.lineno for d in node.decorator_list])
+
+
+def remove_tests(code, tree, removed) -> str:
+    """Remove test nodes from code, and classes that have no test left."""
+    edits = []
+    for node in tree.body:
+        if node in removed:
+            edits.append((get_start_line(node), node.end_lineno, []))
+        elif isinstance(node, ast.ClassDef):
+            methods = [m for m in node.body if m in removed]
+            if len(methods) == len(node.body):
+                edits.append((get_start_line(node), node.end_lineno, []))
+                continue
+            for m in methods:
+                edits.append((get_start_line(m), m.end_lineno, []))
+    return replace_lines(code, edits)
+
+
+def deduplicate_tests(testdir, backup_dir) -> T.List[dict]:
+    """
+    Remove test functions of testdir whose normalised AST, with the module
+    level names they use (helpers, assignments, imports) inlined, equals the
+    one of a test kept before them. Files without tests left are moved to
+    backup_dir, changed files are copied there first. Returns the removed tests.
+    """
+    seen = {}
+    removed_tests = []
+    for filename in sorted(os.listdir(testdir)):
+        path = os.path.join(testdir, filename)
+        if not filename.endswith(".py") or "test" not in filename:
+            continue
+        with open(path) as f:
+            code = f.read()
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            continue
+        bindings = get_module_bindings(tree)
+        tests = get_tests(tree)
+        removed = set()
+        for cls, function in tests:
+            key = get_test_key(cls, function, bindings)
+            name = f"{filename}::{cls.name + '::' if cls else ''}{function.name}"
+            if key in seen:
+                removed.add(function)
+                removed_tests.append({"test": name, "duplicate_of": seen[key]})
+            else:
+                seen[key] = name
+        if not removed:
+            continue
+
+        os.makedirs(backup_dir, exist_ok=True)
+        if len(removed) == len(tests):
+            shutil.move(path, os.path.join(backup_dir, filename))
+            continue
+        shutil.copy(path, os.path.join(backup_dir, filename))
+        with open(path, "w") as f:
+            f.write(remove_tests(code, tree, removed))
+    return removed_tests
@@ -0,0 +1,213 @@
+"""pytest plugin loaded by run_tests.sh for the per-mutant test runs.
+
+Generated tests load the `example` profile when they are imported and
+hypothesis binds it to each test at decoration time. After collection the
+`mutation` profile is applied on top of every test's settings: shrinking is
+skipped because only killed/survived matters, the example budget comes from
+HYPOTHESIS_EVAL_MAX_EXAMPLES and all mutants share one example database, so
+inputs that killed earlier mutants are replayed first.
+
+The mutant under test is identified by diffing the mutated module against the
+pristine copy in PROJECT_ROOT. Every run appends the mutant and the first
+failing test to KILL_LOG, and tests are reordered by how often they killed
+mutants on nearby lines (KILL_HISTORY plus the runs so far), so with `-x` a
+killable mutant is usually killed by the first test. With FULL_KILL_MATRIX=1
+run_tests.sh drops `-x` and every failing test is recorded, for the kill
+matrix of the evaluation.
+
+Mutants listed in SKIP_MUTANTS were killed by an earlier evaluation of the
+same CUT; their runs fail immediately without running any test.
+
+A run without mutation writes its verdict and per-test timings to
+CLEAN_RUN_REPORT. mutmut still times its own clean run, its mutant timeouts
+come from that.
+"""
+
+import difflib
+import hashlib
+import importlib.util
+import json
+import os
+import time
+
+import pytest
+from hypothesis import Phase, settings
+from hypothesis.database import DirectoryBasedExampleDatabase
+
+WORKING_COPY = "/usr/src/project"
+NEARBY_LINES = 3
+
+_timings = {}
+_run = {
+    "mutant": None,
+    "line": None,
+    "killed_by": None,
+    "failed": [],
+    "tests": 0,
+    "skipped": False,
+}
+
+
+def find_mutant():
+    """Return (key, line) of the mutant applied to the module, or (None, None)."""
+    try:
+        spec = importlib.util.find_spec(os.environ["module_name"])
+    except (KeyError, ImportError, ValueError):
+        return None, None
+    if spec is None or not spec.origin or not spec.origin.startswith(WORKING_COPY):
+        return None, None
+    pristine = os.path.join(
+        os.environ.get("PROJECT_ROOT", "/workdir/project"),
+        os.path.relpath(spec.origin, WORKING_COPY),
+    )
+    if not os.path.exists(pristine):
+        return None, None
+    with open(pristine) as f:
+        before = f.read().split("\n")
+    with open(spec.origin) as f:
+        after = f.read().split("\n")
+
+    matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+    for tag, i1, _, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        changed = "\n".join(line.strip() for line in after[j1:j2])
+        digest = hashlib.sha1(changed.encode()).hexdigest()[:12]
+        return f"{i1 + 1}:{digest}", i1 + 1
+    return None, None
+
+
+def load_kill_counts():
+    """Kills per test and mutant line: {nodeid: {line: count}}."""
+    counts = {}
+    history = os.environ.get("KILL_HISTORY")
+    if history and os.path.exists(history):
+        with open(history) as f:
+            for nodeid, lines in json.load(f).get("tests", {}).items():
+                counts[nodeid] = {int(k): v for k, v in lines.items()}
+    log = os.environ.get("KILL_LOG")
+    if log and os.path.exists(log):
+        with open(log) as f:
+            for line in f:
+                run = json.loads(line)
+                if run["killed_by"] is None or run["line"] is None:
+                    continue
+                if run.get("skipped"):
+                    continue
+                lines = counts.setdefault(run["killed_by"], {})
+                lines[run["line"]] = lines.get(run["line"], 0) + 1
+    return counts
+
+
+def pytest_configure(config):
+    phases = [Phase.explicit, Phase.reuse, Phase.generate]
+    if os.environ.get("HYPOTHESIS_EVAL_SHRINK") == "1":
+        phases.append(Phase.shrink)
+    settings.register_profile(
+        "mutation",
+        max_examples=int(os.environ.get("HYPOTHESIS_EVAL_MAX_EXAMPLES", 500)),
+        phases=phases,
+        database=DirectoryBasedExampleDatabase(
+            os.environ.get("HYPOTHESIS_EVAL_DATABASE", "/workdir/hypothesis_db")
+        ),
+        print_blob=False,
+    )
+
+
+def load_skip_mutants():
+    path = os.environ.get("SKIP_MUTANTS")
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def pytest_sessionstart(session):
+    _run["start"] = time.time()
+    _run["mutant"], _run["line"] = find_mutant()
+    skip_mutants = load_skip_mutants()
+    if _run["mutant"] in skip_mutants:
+        _run["killed_by"] = skip_mutants[_run["mutant"]]
+        _run["skipped"] = True
+        write_record()
+        pytest.exit("Mutant was killed by an earlier evaluation", returncode=1)
+
+
+def pytest_collection_modifyitems(session, config, items):
+    order = os.environ.get("KILL_ORDER", "mutant")
+    if order == "off" or _run["mutant"] is None:
+        return
+    counts = load_kill_counts()
+
+    def score(index_item):
+        index, item = index_item
+        lines = counts.get(item.nodeid, {})
+        near = 0
+        if order == "mutant":
+            near = sum(
+                v for k, v in lines.items() if abs(k - _run["line"]) <= NEARBY_LINES
+            )
+        return (-near, -sum(lines.values()), index)
+
+    items[:] = [item for _, item in sorted(enumerate(items), key=score)]
+
+
+def pytest_collection_finish(session):
+    if os.environ.get("HYPOTHESIS_EVAL_PROFILE") == "0":
+        return
+    profile = settings.get_profile("mutation")
+    for item in session.items:
+        test = getattr(item, "obj", None)
+        # the settings are on the function, not on the bound method of a class
+        test = getattr(test, "__func__", test)
+        current = getattr(test, "_hypothesis_internal_use_settings", None)
+        if current is None:
+            continue
+        test._hypothesis_internal_use_settings = settings(
+            current,
+            max_examples=min(current.max_examples, profile.max_examples),
+            phases=[p for p in current.phases if p in profile.phases],
+            database=profile.database,
+        )
+    settings.load_profile("mutation")
+
+
+def pytest_runtest_logreport(report):
+    _timings[report.nodeid] = _timings.get(report.nodeid, 0) + report.duration
+    if report.when == "call":
+        _run["tests"] += 1
+    if report.failed and _run["killed_by"] is None:
+        _run["killed_by"] = report.nodeid
+    if report.failed and report.nodeid not in _run["failed"]:
+        _run["failed"].append(report.nodeid)
+
+
+def write_record():
+    log = os.environ.get("KILL_LOG")
+    if not log:
+        return
+    with open(log, "a") as f:
+        record = {
+            "mutant": _run["mutant"],
+            "line": _run["line"],
+            "killed_by": _run["killed_by"],
+            "failed": _run["failed"],
+            "tests": _run["tests"],
+            "duration": time.time() - _run["start"],
+            "skipped": _run["skipped"],
+        }
+        f.write(json.dumps(record) + "\n")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _run["skipped"]:
+        write_record()
+    path = os.environ.get("CLEAN_RUN_REPORT")
+    if path and _run["mutant"] is None:
+        with open(path, "w") as f:
+            clean_run = {
+                "passed": exitstatus == 0,
+                "duration": time.time() - _run["start"],
+                "tests": _timings,
+            }
+            json.dump(clean_run, f)
@@ -0,0 +1,208 @@
+"""Fork server for running the test suite once per mutant.
+
+`serve` starts a zygote that imports pytest, hypothesis and the third party
+modules used by the tests and the project, then forks one child per request.
+Modules from the project and the test directories are never imported in the
+zygote, so every child imports the (possibly mutated) source fresh.
+
+`run` is the client used by run_tests.sh. It hands its stdout/stderr to the
+child, waits for the exit code that the child reports through a pipe and exits
+with it. If no server is listening it exits with FALLBACK so the caller can run
+pytest directly.
+"""
+
+import ast
+import importlib
+import importlib.util
+import json
+import os
+import select
+import signal
+import socket
+import sys
+
+SOCKET_PATH = os.environ.get("FORK_SERVER_SOCKET", "/tmp/fork_server.sock")
+FRESH_PATHS = ("/usr/src/project", "/workdir")
+FALLBACK = 75  # EX_TEMPFAIL
+
+
+def is_fresh(path):
+    return bool(path) and os.path.abspath(path).startswith(FRESH_PATHS)
+
+
+def collect_imports(dirs):
+    names = set()
+    for d in dirs:
+        for root, _, files in os.walk(d):
+            for file_name in files:
+                if not file_name.endswith(".py"):
+                    continue
+                try:
+                    with open(os.path.join(root, file_name)) as f:
+                        tree = ast.parse(f.read())
+                except (SyntaxError, UnicodeDecodeError, OSError):
+                    continue
+                for node in ast.walk(tree):
+                    if isinstance(node, ast.Import):
+                        names.update(alias.name for alias in node.names)
+                    elif isinstance(node, ast.ImportFrom):
+                        if node.module and node.level == 0:
+                            names.add(node.module)
+    return sorted(names)
+
+
+def preload(dirs):
+    import hypothesis  # noqa: F401
+    import pytest  # noqa: F401
+
+    loaded = []
+    for name in collect_imports(dirs):
+        try:
+            spec = importlib.util.find_spec(name.split(".")[0])
+        except (ImportError, ValueError):
+            continue
+        if spec is None or is_fresh(spec.origin):
+            continue
+        if any(is_fresh(p) for p in spec.submodule_search_locations or []):
+            continue
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except BaseException:
+            continue
+    return loaded
+
+
+def purge_fresh_modules():
+    for name, module in list(sys.modules.items()):
+        if is_fresh(getattr(module, "__file__", None)):
+            del sys.modules[name]
+
+
+def run_child(request, fds, pipe_w):
+    os.setpgid(0, 0)
+    os.dup2(fds[0], 1)
+    os.dup2(fds[1], 2)
+    os.environ.clear()
+    os.environ.update(request["env"])
+    os.chdir(request["cwd"])
+    for path in reversed(os.environ.get("PYTHONPATH", "").split(os.pathsep)):
+        if path and path not in sys.path:
+            sys.path.insert(0, path)
+    sys.path.insert(0, request["cwd"])
+    purge_fresh_modules()
+
+    import pytest
+
+    # pytest and hypothesis are imported before pytest.main, which is expected here.
+    args = ["-W", "ignore::pytest.PytestAssertRewriteWarning"] + request["args"]
+    try:
+        code = int(pytest.main(args))
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.write(pipe_w, f"{code}\n".encode())
+    os._exit(code)
+
+
+def read_request(conn):
+    msg, fds, _, _ = socket.recv_fds(conn, 1, 2)
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            raise ConnectionError("Client closed before sending request")
+        data += chunk
+    return json.loads(data), fds
+
+
+def handle(conn):
+    request, fds = read_request(conn)
+    pipe_r, pipe_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(pipe_r)
+        conn.close()
+        run_child(request, fds, pipe_w)
+    os.close(pipe_w)
+    for fd in fds:
+        os.close(fd)
+
+    result = b""
+    while True:
+        readable, _, _ = select.select([pipe_r, conn], [], [])
+        if pipe_r in readable:
+            chunk = os.read(pipe_r, 64)
+            if not chunk:
+                break
+            result += chunk
+        elif conn in readable and not conn.recv(1):
+            # The client was stopped, e.g. by the mutmut timeout.
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            break
+    os.close(pipe_r)
+    _, status = os.waitpid(pid, 0)
+
+    if result.strip():
+        code = int(result)
+    elif os.WIFSIGNALED(status):
+        code = 128 + os.WTERMSIG(status)
+    else:
+        code = os.WEXITSTATUS(status) or 1
+    try:
+        conn.sendall(f"{code}\n".encode())
+    except OSError:
+        pass
+
+
+def serve(dirs):
+    loaded = preload(dirs)
+    print(f"Fork server preloaded {len(loaded)} modules: {', '.join(loaded)}")
+    sys.stdout.flush()
+
+    if os.path.exists(SOCKET_PATH):
+        os.remove(SOCKET_PATH)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    server.listen()
+    while True:
+        conn, _ = server.accept()
+        try:
+            handle(conn)
+        except Exception as e:
+            print(f"Fork server request failed: {e}", file=sys.stderr)
+        finally:
+            conn.close()
+
+
+def run(args):
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(SOCKET_PATH)
+        request = {"args": args, "cwd": os.getcwd(), "env": dict(os.environ)}
+        socket.send_fds(conn, [b"F"], [1, 2])
+        conn.sendall(json.dumps(request).encode() + b"\n")
+        response = b""
+        while not response.endswith(b"\n"):
+            chunk = conn.recv(64)
+            if not chunk:
+                return FALLBACK
+            response += chunk
+    except OSError:
+        return FALLBACK
+    return int(response)
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "serve":
+        serve(sys.argv[2:])
+    elif sys.argv[1] == "run":
+        sys.exit(run(sys.argv[2:]))
+    else:
+        raise ValueError(f"Unknown command: {sys.argv[1]}")
@@ -3,18 +3,22 @@ import inspect
 import json
 import os
 import shutil
+import sys
 
 from mutmut import mutmut
 
 
-def main(html_report="mutmut_report", json_report="mutmut_report/report.json"):
-    shutil.copytree("/workdir/tests", "/workdir/tests_copy", dirs_exist_ok=True)
+def main(report_dir="mutmut_report"):
+    html_report = report_dir
+    json_report = os.path.join(report_dir, "report.json")
+    tests_copy = os.path.join(os.getcwd(), "tests_copy")
+    shutil.copytree("/workdir/tests", tests_copy, dirs_exist_ok=True)
 
     mutmut_config = mutmut.MutmutConfig()
     mutmut_config.paths_to_mutate = [
         inspect.getfile(importlib.import_module(os.environ["module_name"]))
     ]
-    mutmut_config.tests_dir = "/workdir/tests_copy"
+    mutmut_config.tests_dir = tests_copy
 
     if os.environ.get("line_start") and os.environ.get("line_end"):
         mutmut_config.line_start = int(os.environ["line_start"])
@@ -33,4 +37,4 @@ def main(html_report="mutmut_report", json_report="mutmut_report/report.json"):
 
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:])
@@ -1,8 +1,36 @@
-mkdir -p /usr/src/project
+# /usr/src/project and /workdir/scratch are tmpfs mounts when the host has memory to spare,
+# only the final report is copied to /workdir/mutmut_report.
+SCRATCH=/workdir/scratch
+REPORT=$SCRATCH/mutmut_report
+mkdir -p /usr/src/project $REPORT
 cp -r $PROJECT_ROOT/* /usr/src/project
+cd $SCRATCH
+
+export PYTEST_ADDOPTS="-o cache_dir=$SCRATCH/.pytest_cache"
+export HYPOTHESIS_EVAL_DATABASE=$SCRATCH/hypothesis_db
+export KILL_LOG=$REPORT/kills.jsonl
 
 pip install -e /usr/src/project 2> /dev/null
 
-# Collect coverage data
-pytest -W ignore::DeprecationWarning /workdir/tests/test*.py --cov --cov-branch --cov-report=html:/workdir/mutmut_report/cov_report --cov-report=json:/workdir/mutmut_report/cov_report/coverage.json
-python /workdir/run_mutmut.py
\ No newline at end of file
+# Zygote for the per-mutant test runs, see fork_server.py
+python /usr/src/scripts/fork_server.py serve /workdir/tests /usr/src/project > $SCRATCH/fork_server.log 2>&1 &
+FORK_SERVER_PID=$!
+
+# Clean run: pass/fail verdict, coverage data and per-test timings (clean_run.json) in one execution.
+# It uses the tests' own hypothesis profile. A failing suite skips mutmut, which
+# otherwise times the suite again in its own clean run.
+CLEAN_RUN_REPORT=$REPORT/clean_run.json HYPOTHESIS_EVAL_PROFILE=0 KILL_LOG= PYTHONPATH=$PYTHONPATH:/usr/src/scripts \
+    pytest -W ignore::DeprecationWarning -p eval_plugin /workdir/tests/test*.py --cov --cov-branch --cov-report=html:$REPORT/cov_report --cov-report=json:$REPORT/cov_report/coverage.json
+if python -c "import json, sys; sys.exit(not json.load(open('$REPORT/clean_run.json'))['passed'])" 2> /dev/null; then
+    # Per-test timeout of the mutant runs: a multiple of the slowest test in the clean run, 150s at most.
+    if [ "$ADAPTIVE_TEST_TIMEOUT" = "1" ]; then
+        export TEST_TIMEOUT=$(python -c "import json; t = json.load(open('$REPORT/clean_run.json'))['tests'].values(); print(int(min(150, max(10, $TIMEOUT_MULTIPLIER * max(t, default=0)))))" 2> /dev/null || echo 150)
+        echo "Per-test timeout: ${TEST_TIMEOUT}s"
+    fi
+    python /workdir/run_mutmut.py $REPORT
+else
+    echo "Tests don't run cleanly without mutations."
+fi
+
+kill $FORK_SERVER_PID
+cp -r $REPORT/. /workdir/mutmut_report/
\ No newline at end of file
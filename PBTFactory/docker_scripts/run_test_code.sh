@@ -1,4 +1,7 @@
 cp -r /workdir/project /workdir/project_copy
 pip install -e /workdir/project_copy 2> /dev/null
 
-pytest -W ignore::DeprecationWarning /workdir/test_code.py
\ No newline at end of file
+# Repeat in the same container to catch flaky tests, stop at the first failure.
+for i in $(seq ${REPEAT:-1}); do
+    pytest -W ignore::DeprecationWarning /workdir/test_code.py || exit $?
+done
\ No newline at end of file
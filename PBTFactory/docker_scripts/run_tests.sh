@@ -1,2 +1,15 @@
-export PYTHONPATH=/usr/src/project
-python -m pytest -W ignore::DeprecationWarning -x --timeout 150 /workdir/tests/test*.py
\ No newline at end of file
+export PYTHONPATH=/usr/src/project:/usr/src/scripts
+# Stop at the first failing test unless every test is needed for the kill matrix.
+STOP_AT_FIRST=-x
+if [ "$FULL_KILL_MATRIX" = "1" ]; then
+    STOP_AT_FIRST=
+fi
+PYTEST_ARGS="-W ignore::DeprecationWarning -p eval_plugin $STOP_AT_FIRST --timeout ${TEST_TIMEOUT:-150} /workdir/tests/test*.py"
+
+# Run through the fork server started by run_mutmut.sh, fall back to a fresh interpreter.
+python /usr/src/scripts/fork_server.py run $PYTEST_ARGS
+status=$?
+if [ $status -ne 75 ]; then
+    exit $status
+fi
+python -m pytest $PYTEST_ARGS
\ No newline at end of file
@@ -0,0 +1,142 @@
+import re
+
+from PBTFactory.tokens import count_tokens, truncate_to_tokens
+
+MAX_LINE_CHARS = 300
+MAX_EXAMPLE_LINES = 20
+
+TEST_HEADER = re.compile(r"^_{3,} (\S+) _{3,}$")
+FRAME_SEPARATOR = re.compile(r"^(_ ){5,}_?\s*$")
+LOCATION = re.compile(r"^(\S+?):(\d+): ?(.*)$")
+EXAMPLE_START = re.compile(r"^(E\s+)?(Falsifying example|Failing test case)")
+LOCALS = re.compile(r"^[A-Za-z_]\w* = ")
+PYTHON_FRAME = re.compile(r'^(\s*)File "(.+?)", line \d+')
+
+
+def is_library_path(path) -> bool:
+    return "site-packages" in path or "/lib/python" in path or path.startswith("<")
+
+
+def truncate_line(line, max_chars=MAX_LINE_CHARS) -> str:
+    if len(line) <= max_chars:
+        return line
+    return f"{line[:max_chars]}... [+{len(line) - max_chars} characters]"
+
+
+def condense_example(lines) -> list:
+    """Falsifying example lines, truncated with size hints."""
+    result = [truncate_line(line) for line in lines[:MAX_EXAMPLE_LINES]]
+    if len(lines) > MAX_EXAMPLE_LINES:
+        result.append(f"... [+{len(lines) - MAX_EXAMPLE_LINES} lines of the example]")
+    return result
+
+
+def condense_chunk(lines) -> list:
+    """
+    One chunk between frame separators: short entries (`path:line: in func` with
+    the indented source) followed by at most one long frame that ends with its
+    location. Entries and frames in library code are dropped.
+    """
+    result = []
+    frame = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        location = LOCATION.match(line)
+        if location and location.group(3).startswith("in "):
+            entry = [line]
+            i += 1
+            while i < len(lines) and lines[i].startswith(" "):
+                entry.append(lines[i])
+                i += 1
+            if not is_library_path(location.group(1)):
+                result += entry
+            continue
+        frame.append(line)
+        i += 1
+
+    locations = [LOCATION.match(line) for line in frame if LOCATION.match(line)]
+    if locations and is_library_path(locations[-1].group(1)):
+        # keep the exception of a library frame, it is the error of the test
+        return result + [line for line in frame if line.startswith("E ")][:5]
+    return result + frame
+
+
+def drop_library_python_frames(lines) -> list:
+    """Frames of Python tracebacks (`File "...", line N`) in installed libraries."""
+    result = []
+    skip_indent = None
+    for line in lines:
+        if skip_indent is not None:
+            if line.startswith(skip_indent + " "):
+                continue
+            skip_indent = None
+        frame = PYTHON_FRAME.match(line)
+        if frame and is_library_path(frame.group(2)):
+            skip_indent = frame.group(1)
+            continue
+        result.append(line)
+    return result
+
+
+def condense_test(lines) -> list:
+    lines = drop_library_python_frames(lines)
+    chunks = [[]]
+    for line in lines:
+        if FRAME_SEPARATOR.match(line):
+            chunks.append([])
+        else:
+            chunks[-1].append(line)
+    condensed = []
+    for chunk in chunks:
+        condensed += condense_chunk(chunk)
+
+    result = []
+    example = None
+    for line in condensed:
+        if re.match(r"^\s*\^+\s*$", line):
+            continue  # position markers below the source
+        if example is not None:
+            example.append(line)
+            if re.match(r"^(E\s+)?\)\s*$", line) or not line.strip():
+                result += condense_example(example)
+                example = None
+            continue
+        if EXAMPLE_START.match(line):
+            example = [line]
+            continue
+        result.append(truncate_line(line))
+    if example is not None:
+        result += condense_example(example)
+    return [line for line in result if line.strip()]
+
+
+def condense_error(err_msg: str, max_tokens: int) -> str:
+    """
+    Shorten a pytest/hypothesis error for a fix prompt. Keeps the exception,
+    the frames of the test and the project, the source of the failing assertion
+    and the falsifying example (truncated with size hints). Frames in installed
+    libraries are dropped, and further failing tests if the budget is exceeded.
+    """
+    if count_tokens(err_msg) <= max_tokens:
+        return err_msg
+
+    tests = [[]]
+    for line in err_msg.split("\n"):
+        if TEST_HEADER.match(line) and tests[-1]:
+            tests.append([])
+        tests[-1].append(line)
+
+    result = ""
+    for i, test in enumerate(tests):
+        condensed = "\n".join(condense_test(test))
+        candidate = f"{result}\n\n{condensed}" if result else condensed
+        if result and count_tokens(candidate) > max_tokens:
+            result += f"\n\n... [{len(tests) - i} more failing tests omitted]"
+            break
+        result = candidate
+    if count_tokens(result) > max_tokens:
+        # the local variables of the frames go first
+        lines = result.split("\n")
+        result = "\n".join(line for line in lines if not LOCALS.match(line))
+    return truncate_to_tokens(result, max_tokens)
@@ -0,0 +1,102 @@
+import json
+import math
+import os
+import re
+from dataclasses import dataclass
+
+# Categories of a failed test run
+SYNTAX_ERROR = "syntax_error"
+MODULE_NOT_FOUND = "module_not_found"
+IMPORT_ERROR = "import_error"
+NAME_ERROR = "name_error"
+HEALTH_CHECK = "health_check"
+ASSERTION = "assertion"
+TIMEOUT = "timeout"
+OTHER = "other"
+
+# Policies for semantic failures
+TRIAGE_POLICIES = ["off", "stop_fix", "abandon"]
+
+
+@dataclass
+class TestFailure:
+    category: str
+    name: str = ""  # module, name or health check the error is about
+
+
+def classify_error(logs_err: str) -> TestFailure:
+    """Classify the error text returned by run_code, run_pytest or static_check."""
+    if re.search(r"^Timeout after \d+ seconds", logs_err, re.MULTILINE):
+        return TestFailure(TIMEOUT)
+    if re.search(r"\b(SyntaxError|IndentationError|TabError)\b", logs_err):
+        return TestFailure(SYNTAX_ERROR)
+    match = re.search(r"ModuleNotFoundError: No module named '([\w.]+)'", logs_err)
+    if match:
+        return TestFailure(MODULE_NOT_FOUND, match.group(1))
+    match = re.search(r"ImportError: cannot import name '(\w+)'", logs_err)
+    if match:
+        return TestFailure(IMPORT_ERROR, match.group(1))
+    match = re.search(r"NameError: name '(\w+)' is not defined", logs_err)
+    if match:
+        return TestFailure(NAME_ERROR, match.group(1))
+    if "FailedHealthCheck" in logs_err:
+        match = re.search(r"HealthCheck\.(\w+)", logs_err)
+        return TestFailure(HEALTH_CHECK, match.group(1) if match else "")
+    if re.search(r"^E\s+(AssertionError|assert )", logs_err, re.MULTILINE):
+        return TestFailure(ASSERTION)
+    return TestFailure(OTHER)
+
+
+def get_close_float_assertions(logs_err) -> list:
+    """
+    Failing `assert a == b` statements whose values are floats that are close,
+    e.g. `assert 0.30000000000000004 == 0.3`.
+    """
+    statements = []
+    failing = None
+    for line in logs_err.split("\n"):
+        if re.match(r"^>\s+assert ", line):
+            failing = line[1:].strip()
+            continue
+        match = re.match(r"^E\s+assert (\S+) == (\S+)$", line)
+        if not match or failing is None:
+            continue
+        try:
+            a, b = float(match.group(1)), float(match.group(2))
+        except ValueError:
+            continue
+        if a != b and math.isclose(a, b, rel_tol=1e-3, abs_tol=1e-3):
+            statements.append(failing)
+        failing = None
+    return statements
+
+
+def is_semantic_failure(logs_err: str) -> bool:
+    """
+    A falsified property: an assertion of the test failed on the generated input.
+    Errors in the setup, the imports or the strategy, and float comparisons that
+    only need a tolerance, are fixable.
+    """
+    if classify_error(logs_err).category != ASSERTION:
+        return False
+    return not get_close_float_assertions(logs_err)
+
+
+def summarize_triage(logdirs) -> dict:
+    """Per property type: properties tried, abandoned, and LLM calls saved."""
+    summary = {}
+    for logdir in logdirs:
+        path = os.path.join(logdir, "triage.json")
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            stats = json.load(f)
+        for name, counts in stats.items():
+            total = summary.setdefault(name, {})
+            for key, value in counts.items():
+                total[key] = total.get(key, 0) + value
+    for total in summary.values():
+        total["abandon_rate"] = total.get("abandoned", 0) / max(
+            total.get("properties", 0), 1
+        )
+    return summary
@@ -8,6 +8,7 @@ TIMEOUT = "TIMEOUT"
 NO_MUTANTS = "NO_MUTANTS"
 
 
+import json
 import logging
 import os
 import re
@@ -38,16 +39,38 @@ class ContainerTimeoutError(Exception):
     pass
 
 
+# Fixed ceilings, adaptive timeouts never exceed them.
+RUN_CODE_TIMEOUT = 600
+RUN_PYTEST_TIMEOUT = 60 * 20
+EVAL_WITH_MUTMUT_TIMEOUT = 60 * 60  # 1 hour
+TIMEOUT_MULTIPLIER = 5
+STALL_TIMEOUT = 60
+
+
+def adaptive_timeout(measured, multiplier, floor, ceiling):
+    return min(ceiling, max(floor, measured * multiplier))
+
+
 def wait_for_container(
     container: docker.models.containers.Container,
     timeout: int,
     timeout_msg="",
     log_file_path: typing.Optional[str] = None,
+    stall_timeout: typing.Optional[int] = None,
 ) -> typing.Tuple[int, str]:
+    """
+    stall_timeout: stop the container when its output stops growing. The limit is
+    at least stall_timeout and grows with the longest gap between outputs seen.
+    It starts with the first output, container setup and installs before it
+    only count against timeout.
+    """
     if log_file_path:
         os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
 
     start_time = time.time()
+    last_progress_time = start_time
+    last_logs_len = 0
+    max_gap = 0
     timeouted = False
     try:
         while True:
@@ -58,11 +81,22 @@ def wait_for_container(
                 raise ContainerTimeoutError(
                     f"Container {container.id[:10]} timed out after {timeout} seconds"
                 )
-            write_to_file(
-                log_file_path,
-                container.logs().decode("utf-8"),
-                "w",
-            )
+            logs_so_far = container.logs().decode("utf-8")
+            write_to_file(log_file_path, logs_so_far, "w")
+            if stall_timeout:
+                now = time.time()
+                if len(logs_so_far) != last_logs_len:
+                    if last_logs_len:
+                        max_gap = max(max_gap, now - last_progress_time)
+                    last_progress_time = now
+                    last_logs_len = len(logs_so_far)
+                stall_limit = adaptive_timeout(
+                    max_gap, TIMEOUT_MULTIPLIER, stall_timeout, timeout
+                )
+                if last_logs_len and now - last_progress_time > stall_limit:
+                    raise ContainerTimeoutError(
+                        f"Container {container.id[:10]} made no progress for {stall_limit:.0f} seconds"
+                    )
             time.sleep(5)
     except ContainerTimeoutError:
         container.stop()
@@ -102,14 +136,18 @@ class DockerContainerConfig:
     command: str
     detach: bool
     working_dir: str
+    tmpfs: typing.Dict[str, str]
 
-    def __init__(self, imageid, volumes, environment, command, detach, working_dir):
+    def __init__(
+        self, imageid, volumes, environment, command, detach, working_dir, tmpfs=None
+    ):
         self.imageid = imageid
         self.volumes = volumes
         self.environment = environment
         self.command = command
         self.detach = detach
         self.working_dir = working_dir
+        self.tmpfs = tmpfs or {}
 
 
 def create_docker_container(
@@ -125,11 +163,58 @@ def create_docker_container(
         "detach": docer_config.detach,
         "working_dir": docer_config.working_dir,
     }
+    if docer_config.tmpfs:
+        common_params["tmpfs"] = docer_config.tmpfs
     container = docker.from_env().containers.run(docer_config.imageid, **common_params)
     return container
 
 
-def run_code(file_path, project_path=None, log_path=None, timeout_msg=""):
+def get_available_memory_mb() -> int:
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) // 1024
+    return 0
+
+
+def get_dir_size_mb(path) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
+            if not os.path.islink(file_path):
+                size += os.path.getsize(file_path)
+    return size // (1024 * 1024)
+
+
+def get_scratch_tmpfs(project_path, size_mb) -> typing.Dict[str, str]:
+    """
+    tmpfs mounts for the mutmut working copy and scratch space. Falls back to the
+    container filesystem (no mounts) when the host is short of memory or the
+    project does not fit.
+    The memory check does not reserve memory: containers started together all
+    see the same free memory and can overcommit it, the tmpfs mounts only use
+    memory as they fill up.
+    """
+    if size_mb <= 0:
+        return {}
+    try:
+        available_mb = get_available_memory_mb()
+    except OSError:
+        available_mb = 0
+    project_mb = get_dir_size_mb(project_path) if project_path else 0
+    if available_mb < 2 * size_mb or project_mb * 2 > size_mb:
+        logging.warning(
+            f"Not using tmpfs scratch ({size_mb} MB): {available_mb} MB available, project is {project_mb} MB"
+        )
+        return {}
+    mount_options = f"size={size_mb}m,exec"
+    return {"/usr/src/project": mount_options, "/workdir/scratch": mount_options}
+
+
+def run_code(
+    file_path, project_path=None, log_path=None, timeout_msg="", stall_timeout=None
+):
     if not file_path.startswith("/"):
         file_path = os.path.abspath(file_path)
     volumes = {file_path: {"bind": "/workdir/test_code.py", "mode": "ro"}}
@@ -148,7 +233,7 @@ def run_code(file_path, project_path=None, log_path=None, timeout_msg=""):
     )
     container = create_docker_container(docker_config)
     exit_code, logs, logs_err, time_taken, timeouted = wait_for_container(
-        container, 600, timeout_msg
+        container, RUN_CODE_TIMEOUT, timeout_msg, stall_timeout=stall_timeout
     )
 
     write_to_file(
@@ -160,7 +245,14 @@ def run_code(file_path, project_path=None, log_path=None, timeout_msg=""):
     return exit_code, remove_dup_lines(logs), remove_dup_lines(logs_err), time_taken
 
 
-def run_pytest(file_path, project_path=None, log_path=None, timeout_msg=""):
+def run_pytest(
+    file_path,
+    project_path=None,
+    log_path=None,
+    timeout_msg="",
+    repeat=1,
+    timeout=None,
+):
     if not file_path.startswith("/"):
         file_path = os.path.abspath(file_path)
     volumes = {file_path: {"bind": "/workdir/test_code.py", "mode": "ro"}}
@@ -172,14 +264,14 @@ def run_pytest(file_path, project_path=None, log_path=None, timeout_msg=""):
     docker_config = DockerContainerConfig(
         imageid="hypothesis_docker",
         volumes=volumes,
-        environment=[f"PYTHONPATH=/workdir/project"],
+        environment=[f"PYTHONPATH=/workdir/project", f"REPEAT={repeat}"],
         working_dir="/workdir",
         command="bash /usr/src/scripts/run_test_code.sh",
         detach=True,
     )
     container = create_docker_container(docker_config)
     exit_code, logs, logs_err, time_taken, timeouted = wait_for_container(
-        container, 60 * 20, timeout_msg
+        container, timeout or RUN_PYTEST_TIMEOUT * repeat, timeout_msg
     )
 
     write_to_file(
@@ -214,6 +306,14 @@ def eval_with_mutmut(
     log_path=None,
     mut_line_start=0,
     mut_line_end=1000000,
+    hypothesis_examples=500,
+    hypothesis_shrink=False,
+    test_order="mutant",
+    tmpfs_mb=0,
+    skip_mutants=None,
+    timeout=EVAL_WITH_MUTMUT_TIMEOUT,
+    adaptive_test_timeout=True,
+    full_kill_matrix=False,
     timeout_msg="",
 ):
     logging.info(
@@ -234,6 +334,10 @@ def eval_with_mutmut(
             project_path = os.path.abspath(project_path)
         volumes[project_path] = {"bind": "/workdir/project", "mode": "ro"}
 
+    # Mutants killed by an earlier evaluation, {mutant key: test}
+    with open(os.path.join(result_path, "skip_mutants.json"), "w") as f:
+        json.dump(skip_mutants or {}, f)
+
     docker_config = DockerContainerConfig(
         imageid="hypothesis_docker",
         volumes=volumes,
@@ -242,16 +346,25 @@ def eval_with_mutmut(
             f"module_name={module_name}",
             f"line_start={mut_line_start}",
             f"line_end={mut_line_end}",
+            f"HYPOTHESIS_EVAL_MAX_EXAMPLES={hypothesis_examples}",
+            f"HYPOTHESIS_EVAL_SHRINK={int(hypothesis_shrink)}",
+            f"KILL_ORDER={test_order}",
+            "KILL_HISTORY=/workdir/mutmut_report/kill_history.json",
+            "SKIP_MUTANTS=/workdir/mutmut_report/skip_mutants.json",
+            f"ADAPTIVE_TEST_TIMEOUT={int(adaptive_test_timeout)}",
+            f"TIMEOUT_MULTIPLIER={TIMEOUT_MULTIPLIER}",
+            f"FULL_KILL_MATRIX={int(full_kill_matrix)}",
             "PYTHONPATH=/usr/src/project",
         ],
         working_dir="/workdir",
         command="bash /workdir/run_mutmut.sh",
         detach=True,
+        tmpfs=get_scratch_tmpfs(project_path, tmpfs_mb),
     )
     container = create_docker_container(docker_config)
     exit_code, logs, logs_err, time_taken, timeouted = wait_for_container(
         container,
-        60 * 60,  # 1 hour
+        timeout,
         timeout_msg,
         os.path.join(log_path, "eval_with_mutmut.log"),
     )
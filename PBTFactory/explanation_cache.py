@@ -0,0 +1,53 @@
+import fcntl
+import hashlib
+import json
+import os
+import typing as T
+
+from PBTFactory.code_under_test import code_under_test
+
+# Reuse of cached explanations: never, in every round, or only within a round
+EXPLANATION_CACHE_POLICIES = ["off", "always", "per_round"]
+
+
+def get_cache_tag(models, policy, round_name="") -> str:
+    """
+    Part of the key that is shared by the pipelines of a run: the models that
+    answer, and the round with the per_round policy.
+    """
+    tag = ",".join(sorted(models))
+    if policy == "per_round":
+        tag += f"|round={round_name}"
+    return tag
+
+
+def explanation_key(cut: code_under_test, tag) -> str:
+    parts = [cut.entry_point, cut.function_body, cut.test, cut.class_structure, tag]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def load_explanation(cache_dir, key) -> T.Optional[str]:
+    path = os.path.join(cache_dir, f"{key}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["explanation"]
+
+
+def lock_explanation(cache_dir, key):
+    """
+    Claim a key, the other pipelines and processes that need it wait until the
+    explanation is saved instead of asking for it as well.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    lock = open(os.path.join(cache_dir, f"{key}.lock"), "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def save_explanation(cache_dir, key, cut: code_under_test, explanation):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({"id": cut.id, "explanation": explanation}, f, indent=4)
+    os.replace(path + ".tmp", path)
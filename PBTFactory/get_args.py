@@ -1,7 +1,10 @@
 import argparse
 import os
 
-from PBTFactory.request_manager import RequestType
+from PBTFactory.error_triage import TRIAGE_POLICIES
+from PBTFactory.explanation_cache import EXPLANATION_CACHE_POLICIES
+from PBTFactory.kill_matrix import KILL_MATRIX_MODES
+from PBTFactory.request_manager import STRUCTURED_OUTPUT_MODES, RequestType
 
 
 # Copy from https://stackoverflow.com/questions/14117415/how-can-i-constrain-a-value-parsed-with-argparse-for-example-restrict-an-integ
@@ -34,6 +37,11 @@ def get_args(parser: argparse.ArgumentParser = None):
     parser.add_argument("-v", "--verbose", help="Verbose", action="store_true")
     parser.add_argument("-d", "--dataset", help="Path to dataset.", default="dataset")
     parser.add_argument("--project_src_code", help="Path project code.", default="")
+    parser.add_argument(
+        "--given_tests",
+        help="Folder with a folder of runnable given tests (test_*.py) per CUT id for the mutant baseline.",
+        default="",
+    )
     parser.add_argument(
         "--config_file",
         help="Config file.",
@@ -58,6 +66,19 @@ def get_args(parser: argparse.ArgumentParser = None):
         if "retry" not in v:
             v["retry"] = 4
 
+        if "max_tokens" not in v:
+            v["max_tokens"] = 8 * 1024
+
+        if "num_ctx" not in v:
+            v["num_ctx"] = 0
+
+        if "structured_output" not in v:
+            v["structured_output"] = ""
+        if v["structured_output"] not in STRUCTURED_OUTPUT_MODES:
+            raise ValueError(
+                f"Invalid structured_output: {k}: {v['structured_output']}"
+            )
+
         if "allow_request_type" not in v or v["allow_request_type"] == []:
             v["allow_request_type"] = RequestType.get_all_types()
         v["allow_request_type"] = [
@@ -67,6 +88,11 @@ def get_args(parser: argparse.ArgumentParser = None):
 
     if "max_workers" not in config_from_file:
         config_from_file["max_workers"] = 3
+    if "max_eval_workers" not in config_from_file:
+        # per process, run_*.sh start several rounds and pipelines at once
+        config_from_file["max_eval_workers"] = config_from_file["max_workers"]
+    if "eval_queue_size" not in config_from_file:
+        config_from_file["eval_queue_size"] = config_from_file["max_eval_workers"]
     if "max_retry" not in config_from_file:
         config_from_file["max_retry"] = 3
     if "max_fix" not in config_from_file:
@@ -77,10 +103,58 @@ def get_args(parser: argparse.ArgumentParser = None):
         config_from_file["max_strategy_fix"] = 1
     if "max_hypothesis_examples" not in config_from_file:
         config_from_file["max_hypothesis_examples"] = 500
+    if "eval_hypothesis_examples" not in config_from_file:
+        config_from_file["eval_hypothesis_examples"] = config_from_file[
+            "max_hypothesis_examples"
+        ]
+    if "eval_hypothesis_shrink" not in config_from_file:
+        config_from_file["eval_hypothesis_shrink"] = False
+    if "test_order" not in config_from_file:
+        config_from_file["test_order"] = "mutant"
+    if "kill_history_dir" not in config_from_file:
+        config_from_file["kill_history_dir"] = ""
+    if "baseline_dir" not in config_from_file:
+        config_from_file["baseline_dir"] = ""
+    if "eval_tmpfs_mb" not in config_from_file:
+        config_from_file["eval_tmpfs_mb"] = 1024
+    if "incremental_eval" not in config_from_file:
+        config_from_file["incremental_eval"] = False
+    if "early_stop_score" not in config_from_file:
+        config_from_file["early_stop_score"] = 0
+    if "adaptive_timeouts" not in config_from_file:
+        config_from_file["adaptive_timeouts"] = True
+    if "dedup_tests" not in config_from_file:
+        config_from_file["dedup_tests"] = False
+    if "kill_matrix" not in config_from_file:
+        config_from_file["kill_matrix"] = "first_kill"
+    if "static_check" not in config_from_file:
+        config_from_file["static_check"] = True
+    if "auto_repair" not in config_from_file:
+        config_from_file["auto_repair"] = True
+    if "triage_policy" not in config_from_file:
+        config_from_file["triage_policy"] = "off"
+    if "fix_error_tokens" not in config_from_file:
+        config_from_file["fix_error_tokens"] = 0
+    if "test_context_tokens" not in config_from_file:
+        config_from_file["test_context_tokens"] = 0
+    if "batch_property_check" not in config_from_file:
+        config_from_file["batch_property_check"] = False
+    if "strategy_synthesis" not in config_from_file:
+        config_from_file["strategy_synthesis"] = False
+    if "strategy_store_dir" not in config_from_file:
+        config_from_file["strategy_store_dir"] = ""
+    if "explanation_cache" not in config_from_file:
+        config_from_file["explanation_cache"] = "off"
+    if "explanation_cache_dir" not in config_from_file:
+        config_from_file["explanation_cache_dir"] = "explanation_cache"
+    if "max_continuations" not in config_from_file:
+        config_from_file["max_continuations"] = 2
     if "verbose" not in config_from_file:
         config_from_file["verbose"] = False
 
     args.max_workers = check_positive_int(config_from_file["max_workers"])
+    args.max_eval_workers = check_positive_int(config_from_file["max_eval_workers"])
+    args.eval_queue_size = check_positive_int(config_from_file["eval_queue_size"])
     args.max_retry = check_positive_int(config_from_file["max_retry"])
     args.max_fix = check_positive_int(config_from_file["max_fix"])
     args.max_strategy_retry = check_positive_int(config_from_file["max_strategy_retry"])
@@ -88,6 +162,40 @@ def get_args(parser: argparse.ArgumentParser = None):
     args.max_hypothesis_examples = check_positive_int(
         config_from_file["max_hypothesis_examples"]
     )
+    args.eval_hypothesis_examples = check_positive_int(
+        config_from_file["eval_hypothesis_examples"]
+    )
+    args.eval_hypothesis_shrink = bool(config_from_file["eval_hypothesis_shrink"])
+    if config_from_file["test_order"] not in ["mutant", "global", "off"]:
+        raise ValueError(f"Invalid test_order: {config_from_file['test_order']}")
+    args.test_order = config_from_file["test_order"]
+    args.kill_history_dir = config_from_file["kill_history_dir"]
+    args.baseline_dir = config_from_file["baseline_dir"]
+    args.eval_tmpfs_mb = int(config_from_file["eval_tmpfs_mb"])
+    args.incremental_eval = bool(config_from_file["incremental_eval"])
+    args.early_stop_score = float(config_from_file["early_stop_score"])
+    args.adaptive_timeouts = bool(config_from_file["adaptive_timeouts"])
+    args.dedup_tests = bool(config_from_file["dedup_tests"])
+    if config_from_file["kill_matrix"] not in KILL_MATRIX_MODES:
+        raise ValueError(f"Invalid kill_matrix: {config_from_file['kill_matrix']}")
+    args.kill_matrix = config_from_file["kill_matrix"]
+    args.static_check = bool(config_from_file["static_check"])
+    args.auto_repair = bool(config_from_file["auto_repair"])
+    if config_from_file["triage_policy"] not in TRIAGE_POLICIES:
+        raise ValueError(f"Invalid triage_policy: {config_from_file['triage_policy']}")
+    args.triage_policy = config_from_file["triage_policy"]
+    args.fix_error_tokens = int(config_from_file["fix_error_tokens"])
+    args.test_context_tokens = int(config_from_file["test_context_tokens"])
+    args.max_continuations = int(config_from_file["max_continuations"])
+    args.batch_property_check = bool(config_from_file["batch_property_check"])
+    args.strategy_synthesis = bool(config_from_file["strategy_synthesis"])
+    args.strategy_store_dir = config_from_file["strategy_store_dir"]
+    if config_from_file["explanation_cache"] not in EXPLANATION_CACHE_POLICIES:
+        raise ValueError(
+            f"Invalid explanation_cache: {config_from_file['explanation_cache']}"
+        )
+    args.explanation_cache = config_from_file["explanation_cache"]
+    args.explanation_cache_dir = config_from_file["explanation_cache_dir"]
     if "system_message" in config_from_file:
         args.system_message = config_from_file["system_message"]
     else:
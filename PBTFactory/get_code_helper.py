@@ -1,7 +1,14 @@
 import ast
+import re
+import textwrap
 
 import astor
 
+from PBTFactory.tokens import count_tokens, truncate_to_tokens
+
+DEFINITION = re.compile(r"^(\s*)(@|def |async def |class )")
+DEFINITION_NAME = re.compile(r"^\s*(?:async )?(def|class) (\w+)", re.MULTILINE)
+
 
 class ReplaceFuncImplWithPass(ast.NodeTransformer):
     def visit_FunctionDef(self, node):
@@ -31,3 +38,165 @@ def get_class_structure(code, class_name):
     transformed_tree = transformer.visit(tree)
     ast.fix_missing_locations(transformed_tree)
     return transformed_tree
+
+
+def get_test_lines(test_code, max_line=300, hard_limit=600):
+    """The first non-empty lines of the tests, up to the end of a function."""
+    test_lines = []
+    for line in test_code.split("\n"):
+        if len(test_lines) > max_line and "def " in line:
+            break
+        if len(test_lines) > hard_limit:
+            break
+        if line.strip():
+            test_lines.append(line)
+    return test_lines
+
+
+def score_names(names, test_name, function_name, class_name):
+    """References of a test to the function under test and its class."""
+    score = 2 * names.count(function_name)
+    if class_name:
+        score += names.count(class_name)
+    if function_name.strip("_").lower() in test_name.lower():
+        score += 2
+    return score
+
+
+def get_referenced_names(node):
+    names = []
+    for n in ast.walk(node):
+        if isinstance(n, ast.Name):
+            names.append(n.id)
+        elif isinstance(n, ast.Attribute):
+            names.append(n.attr)
+    return names
+
+
+def get_node_lines(node):
+    """First and last line of a definition, including its decorators."""
+    start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+    return start, node.end_lineno
+
+
+def get_tests(tree, function_name, class_name):
+    """
+    Imports and tests of a module: (score, first line, last line, lines of the
+    header of its class and of the setUp methods).
+    """
+    imports = []
+    tests = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append((node.lineno, node.end_lineno))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            names = get_referenced_names(node)
+            score = score_names(names, node.name, function_name, class_name)
+            tests.append((score, *get_node_lines(node), ()))
+        elif isinstance(node, ast.ClassDef):
+            header = [(get_node_lines(node)[0], node.body[0].lineno - 1)]
+            methods = [
+                method
+                for method in node.body
+                if isinstance(method, (ast.FunctionDef, ast.AsyncFunctionDef))
+            ]
+            for method in methods:
+                if method.name in ["setUp", "setUpClass"]:
+                    header.append(get_node_lines(method))
+            for method in methods:
+                if method.name.startswith("test"):
+                    names = get_referenced_names(method)
+                    score = score_names(names, method.name, function_name, class_name)
+                    tests.append((score, *get_node_lines(method), tuple(header)))
+    return imports, tests
+
+
+def split_definitions(lines, function_name, class_name):
+    """
+    Imports and tests, as in get_tests, of code that cannot be parsed, e.g.
+    methods copied out of their class. A definition ends where the next one
+    starts that is not nested in it. References are counted by name.
+    """
+    blocks = []  # [first line, kind]
+    def_indent = None
+    decorators = False
+    for i, line in enumerate(lines, 1):
+        match = DEFINITION.match(line)
+        if not match:
+            continue
+        indent = len(match.group(1))
+        kind = match.group(2).strip()
+        if def_indent is not None and indent > def_indent:
+            continue  # nested function
+        if decorators:
+            if kind != "@":
+                decorators = False
+                blocks[-1][1] = kind
+                def_indent = indent if kind != "class" else None
+            continue
+        blocks.append([i, kind])
+        decorators = kind == "@"
+        def_indent = indent if kind not in ["@", "class"] else None
+    if not blocks:
+        return [], []
+
+    imports = [(1, blocks[0][0] - 1)]
+    tests = []
+    header = ()
+    ends = [start - 1 for start, _ in blocks[1:]] + [len(lines)]
+    for (start, kind), end in zip(blocks, ends):
+        code = "\n".join(lines[start - 1 : end])
+        if kind == "class":
+            header = ((start, end),)
+            continue
+        match = DEFINITION_NAME.search(code)
+        test_name = match.group(2) if match else ""
+        names = re.findall(r"\w+", code)
+        score = score_names(names, test_name, function_name, class_name)
+        tests.append((score, start, end, header))
+    return imports, tests
+
+
+def select_test_context(test_code, entry_point, max_tokens):
+    """
+    The tests that reference the entry point most, packed into max_tokens and
+    kept in the order of the file, with the imports and the headers and setUp
+    methods of their test classes. Falls back to the first lines of the file,
+    truncated to max_tokens, if none of the tests references the entry point.
+    """
+    *class_names, function_name = entry_point.split(".")
+    class_name = class_names[-1] if class_names else ""
+    lines = test_code.split("\n")
+    try:
+        tree = ast.parse(test_code)
+    except SyntaxError:
+        try:
+            tree = ast.parse(textwrap.dedent(test_code))
+        except SyntaxError:
+            tree = None
+    if tree is not None:
+        lines = textwrap.dedent(test_code).split("\n")
+        imports, tests = get_tests(tree, function_name, class_name)
+    else:
+        imports, tests = split_definitions(lines, function_name, class_name)
+
+    relevant = sorted([t for t in tests if t[0] > 0], key=lambda t: (-t[0], t[1]))
+    if not relevant:
+        return truncate_to_tokens("\n".join(get_test_lines(test_code)), max_tokens)
+
+    def render(selected):
+        ranges = set(imports)
+        for _, start, end, header in selected:
+            ranges |= {(start, end), *header}
+        context = []
+        for start, end in sorted(ranges):
+            context += [line for line in lines[start - 1 : end] if line.strip()]
+        return "\n".join(context)
+
+    selected = []
+    for test in relevant:
+        if count_tokens(render(selected + [test])) <= max_tokens:
+            selected.append(test)
+    if not selected:
+        return truncate_to_tokens(render(relevant[:1]), max_tokens)
+    return render(selected)
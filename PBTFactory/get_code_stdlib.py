@@ -6,10 +6,14 @@ import shutil
 import astor
 
 from PBTFactory.code_under_test import code_under_test
-from PBTFactory.get_code_helper import get_class_structure
+from PBTFactory.get_code_helper import (
+    get_class_structure,
+    get_test_lines,
+    select_test_context,
+)
 
 
-def get_code_stdlib(path_to_data):
+def get_code_stdlib(path_to_data, test_context_tokens=0):
     with open(os.path.join(path_to_data, "setup_data.json")) as f:
         data = json.load(f)
     name = f"{data['package']}.{data['classname']}.{data['name']}"
@@ -21,18 +25,8 @@ def get_code_stdlib(path_to_data):
         full_code.split("\n")[data["startline"] - 1 : data["endline"]]
     )
 
-    max_line = 300
-    hard_limit = 600
-    test_lines = []
     with open(os.path.join(path_to_data, "test_code.py")) as f:
-        test_lines_raw = f.read().split("\n")
-    for line in test_lines_raw:
-        if len(test_lines) > max_line and "def " in line:
-            break
-        if len(test_lines) > hard_limit:
-            break
-        if line.strip():
-            test_lines.append(line)
+        test_code = f.read()
 
     entry_point = (
         f"{data['classname']}.{data['name']}"
@@ -40,6 +34,11 @@ def get_code_stdlib(path_to_data):
         else data["name"]
     )
 
+    if test_context_tokens:
+        test = select_test_context(test_code, entry_point, test_context_tokens)
+    else:
+        test = "\n".join(get_test_lines(test_code))
+
     class_structure = astor.to_source(get_class_structure(full_code, data["classname"]))
 
     cut = code_under_test(
@@ -47,7 +46,7 @@ def get_code_stdlib(path_to_data):
         data["signature"],
         entry_point,
         function_body,
-        "\n".join(test_lines),
+        test,
         class_structure,
     )
     cut.module = data["package"]
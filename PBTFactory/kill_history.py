@@ -0,0 +1,54 @@
+import fcntl
+import json
+import os
+import shutil
+
+
+def load_kill_log(kill_log_path) -> list:
+    """Records written by eval_plugin.py, one per test run inside mutmut."""
+    if not os.path.exists(kill_log_path):
+        return []
+    with open(kill_log_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def get_killed_by(kill_log: list) -> dict:
+    """Map each killed mutant to the test that killed it first."""
+    killed_by = {}
+    for run in kill_log:
+        if run["mutant"] is not None and run["killed_by"] is not None:
+            killed_by.setdefault(run["mutant"], run["killed_by"])
+    return killed_by
+
+
+def copy_kill_history(history_path, dest_path):
+    if os.path.exists(history_path):
+        shutil.copyfile(history_path, dest_path)
+
+
+def update_kill_history(history_path, kill_log_path):
+    """
+    Add the kills of one evaluation to the per-CUT history shared by all rounds
+    and pipelines. The history keeps kill counts per test and mutant line.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+    with open(history_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        history = {"runs": 0, "tests": {}}
+        if os.path.exists(history_path):
+            with open(history_path) as f:
+                history = json.load(f)
+
+        for run in load_kill_log(kill_log_path):
+            if run["mutant"] is None or run.get("skipped"):
+                continue
+            history["runs"] += 1
+            if run["killed_by"] is None:
+                continue
+            lines = history["tests"].setdefault(run["killed_by"], {})
+            line = str(run["line"])
+            lines[line] = lines.get(line, 0) + 1
+
+        with open(history_path + ".tmp", "w") as f:
+            json.dump(history, f)
+        os.replace(history_path + ".tmp", history_path)
@@ -0,0 +1,148 @@
+import ast
+import os
+import typing as T
+
+from PBTFactory.dedup import get_tests, remove_tests
+
+KILL_MATRIX_MODES = ["off", "first_kill", "full"]
+
+
+def parse_nodeid(nodeid) -> T.Tuple[str, T.List[str]]:
+    """File name and names of a pytest node id, without parameters."""
+    path, *names = nodeid.split("[")[0].split("::")
+    return os.path.basename(path), names
+
+
+def get_test_id(nodeid) -> str:
+    """`file::Class::test` as in dedup.json, the same for every test folder."""
+    filename, names = parse_nodeid(nodeid)
+    return "::".join([filename] + names)
+
+
+def get_existing_tests(testdir) -> set:
+    tests = set()
+    for filename in os.listdir(testdir):
+        if not filename.endswith(".py") or "test" not in filename:
+            continue
+        with open(os.path.join(testdir, filename)) as f:
+            try:
+                tree = ast.parse(f.read())
+            except SyntaxError:
+                continue
+        for cls, function in get_tests(tree):
+            names = ([cls.name] if cls else []) + [function.name]
+            tests.add("::".join([filename] + names))
+    return tests
+
+
+def get_kills(kill_log: list, duplicates: dict) -> T.Dict[str, set]:
+    """
+    Tests that failed on each mutant, all mutants of the log are keys. Tests
+    removed as duplicates are replaced by the test they duplicate.
+    """
+    kills = {}
+    for run in kill_log:
+        if run["mutant"] is None:
+            continue
+        failed = set(run.get("failed") or [])
+        if run["killed_by"] is not None:
+            failed.add(run["killed_by"])
+        tests = {get_test_id(nodeid) for nodeid in failed}
+        tests = {duplicates.get(test, test) for test in tests}
+        kills.setdefault(run["mutant"], set()).update(tests)
+    return kills
+
+
+def build_kill_matrix(
+    kill_log: list, durations: dict, complete: bool, tests, duplicates=None
+) -> dict:
+    """
+    Test x mutant matrix of an evaluation over the given tests. Each row is the
+    bitmap of the mutants a test killed as a hex string, bit i is mutants[i].
+    Without `complete` only the first failing test of each mutant run is known.
+    Kills of tests that are not in `tests` (e.g. removed since a streamed
+    evaluation) are listed under `unknown_tests`.
+    """
+    kills = get_kills(kill_log, duplicates or {})
+    mutants = sorted(kills)
+    tests = sorted(tests)
+    rows = {test: 0 for test in tests}
+    unknown = set()
+    for i, mutant in enumerate(mutants):
+        for test in kills[mutant]:
+            if test in rows:
+                rows[test] |= 1 << i
+            else:
+                unknown.add(test)
+    test_durations = {}
+    for nodeid, duration in durations.items():
+        test = get_test_id(nodeid)
+        test_durations[test] = test_durations.get(test, 0) + duration
+    return {
+        "complete": complete,
+        "mutants": mutants,
+        "tests": tests,
+        "rows": [format(rows[test], "x") for test in tests],
+        "durations": [test_durations.get(test, 0) for test in tests],
+        "unknown_tests": sorted(unknown),
+    }
+
+
+def minimize_tests(matrix: dict) -> T.List[str]:
+    """
+    Greedy set cover: take the test that kills most of the mutants left, the
+    faster one on ties, then drop tests whose kills the others cover.
+    """
+    rows = {t: int(r, 16) for t, r in zip(matrix["tests"], matrix["rows"])}
+    durations = dict(zip(matrix["tests"], matrix["durations"]))
+    left = 0
+    for row in rows.values():
+        left |= row
+    selected = []
+    while left:
+        test = min(
+            rows,
+            key=lambda t: (-bin(rows[t] & left).count("1"), durations[t], t),
+        )
+        selected.append(test)
+        left &= ~rows[test]
+
+    for test in sorted(selected, key=lambda t: -durations[t]):
+        others = 0
+        for other in selected:
+            if other != test:
+                others |= rows[other]
+        if rows[test] & ~others == 0:
+            selected.remove(test)
+    return sorted(selected)
+
+
+def write_minimal_suite(testdir, selected, dest) -> T.List[str]:
+    """
+    Copy the test files of testdir to dest with only the selected tests.
+    Returns the selected tests that are not in testdir.
+    """
+    selected_names = {}
+    for test in selected:
+        filename, *names = test.split("::")
+        selected_names.setdefault(filename, set()).add(tuple(names))
+
+    os.makedirs(dest, exist_ok=True)
+    written = set()
+    for filename, names in selected_names.items():
+        path = os.path.join(testdir, filename)
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            code = f.read()
+        tree = ast.parse(code)
+        removed = set()
+        for cls, function in get_tests(tree):
+            name = ((cls.name,) if cls else ()) + (function.name,)
+            if name in names:
+                written.add("::".join((filename,) + name))
+            else:
+                removed.add(function)
+        with open(os.path.join(dest, filename), "w") as f:
+            f.write(remove_tests(code, tree, removed))
+    return sorted(set(selected) - written)
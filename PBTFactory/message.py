@@ -1,5 +1,8 @@
+import ast
+import fnmatch
 import json
 import re
+import typing
 
 
 class MessageManager:
@@ -45,11 +48,111 @@ def get_code_blocks(msg):
     return code_search
 
 
-def count_code(msg):
-    return len(get_code_blocks(msg))
-
-
-def find_code(msg):
+def strip_language(code):
+    code = code.strip()
+    for language in ["python", "json"]:
+        if code.startswith(language):
+            return code[len(language) :].strip()
+    return code
+
+
+def get_definitions(tree: ast.Module) -> set:
+    return {
+        node.name
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+
+
+def defines_all(tree: ast.Module, required_names) -> bool:
+    names = get_definitions(tree)
+    return all(fnmatch.filter(names, pattern) for pattern in required_names)
+
+
+def get_statement_source(lines, node) -> str:
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1 : node.end_lineno])
+
+
+def merge_code_blocks(blocks) -> str:
+    """
+    Join code blocks into one module. Imports come first and are kept once, a
+    later definition replaces an earlier one with the same name in its place.
+    """
+    imports = {}
+    statements = {}
+    for code in blocks:
+        lines = code.split("\n")
+        for node in ast.parse(code).body:
+            source = get_statement_source(lines, node)
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                imports[ast.dump(node)] = source
+            elif isinstance(
+                node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+            ):
+                statements[node.name] = source
+            else:
+                statements[ast.dump(node)] = source
+    return "\n".join(imports.values()) + "\n\n\n" + "\n\n\n".join(statements.values())
+
+
+def extract_code(msg, required_names) -> typing.Optional[str]:
+    """
+    Select the code that defines `required_names` (fnmatch patterns such as
+    "test*") among the code blocks of a message. Blocks that do not parse are
+    ignored. Helpers defined in other blocks are merged into the selected block,
+    and blocks that only together define the required names are merged.
+    A single code block is always returned, problems in it are left to the
+    checks that run the code. None if the code cannot be determined.
+    """
+    blocks = [strip_language(code) for code in get_code_blocks(msg)]
+    blocks = [code for code in blocks if code]
+    if len(blocks) == 1:
+        return blocks[0]
+
+    parsed = []
+    for code in blocks:
+        try:
+            parsed.append((code, ast.parse(code)))
+        except SyntaxError:
+            continue
+    if not parsed:
+        return None
+
+    matching = [
+        (code, tree) for code, tree in parsed if defines_all(tree, required_names)
+    ]
+    if not matching:
+        merged = merge_code_blocks([code for code, _ in parsed])
+        if required_names and defines_all(ast.parse(merged), required_names):
+            return merged
+        return None
+
+    best, best_tree = max(matching, key=lambda x: len(x[0]))
+    used = {
+        node.id
+        for node in ast.walk(best_tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+    }
+    missing = used - get_definitions(best_tree)
+    helpers = [
+        code
+        for code, tree in parsed
+        if code is not best and get_definitions(tree) & missing
+    ]
+    if helpers:
+        return merge_code_blocks(helpers + [best])
+    return best
+
+
+def find_code(msg, required_names=()):
+    """
+    With required_names see extract_code, the longest code block is the fallback.
+    """
+    if required_names:
+        code = extract_code(msg, required_names)
+        if code is not None:
+            return code
     code_search = get_code_blocks(msg)
     if len(code_search) > 1:
         pass
@@ -58,11 +161,7 @@ def find_code(msg):
     longest_code = ""
     max_len = 0
     for code in code_search:  # Find the longest code block
-        code = code.strip()
-        if code.startswith("python"):
-            code = code[len("python") :].strip()
-        elif code.startswith("json"):
-            code = code[len("json") :].strip()
+        code = strip_language(code)
         if len(code) > max_len:
             longest_code = code
             max_len = len(code)
@@ -78,3 +177,71 @@ def replace_code(msg, code):
     except re.error:
         result = msg
     return result
+
+
+def replace_lines(code, edits) -> str:
+    """edits: [(first line, last line, new lines)], 1-based and inclusive."""
+    lines = code.split("\n")
+    for start, end, new_lines in sorted(edits, reverse=True):
+        lines[start - 1 : end] = new_lines
+    return "\n".join(lines)
+
+
+def is_max_examples_settings(decorator) -> bool:
+    if not isinstance(decorator, ast.Call):
+        return False
+    func = decorator.func
+    name = func.id if isinstance(func, ast.Name) else getattr(func, "attr", "")
+    return name == "settings" and any(
+        k.arg == "max_examples" for k in decorator.keywords
+    )
+
+
+def normalize_imports(
+    code, module, import_name, drop_names=(), drop_max_examples=False
+) -> str:
+    """
+    Import `import_name` from the module under test wherever the code imports it
+    from somewhere else, and remove imports of `drop_names` (names defined in
+    the same file). With drop_max_examples, `@settings(max_examples=...)`
+    decorators are removed so the profile of the file applies.
+    Code that does not parse is returned unchanged.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+    lines = code.split("\n")
+    edits = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom):
+            from_cut = node.level == 0 and node.module == module
+            kept = []
+            moved = []
+            for alias in node.names:
+                if alias.name in drop_names:
+                    continue
+                if alias.name == import_name and not from_cut:
+                    moved.append(alias)
+                else:
+                    kept.append(alias)
+            if len(kept) == len(node.names):
+                continue
+            indent = lines[node.lineno - 1][: node.col_offset]
+            new_lines = []
+            if kept:
+                new_lines.append(
+                    indent + ast.unparse(ast.ImportFrom(node.module, kept, node.level))
+                )
+            if moved:
+                new_lines.append(indent + ast.unparse(ast.ImportFrom(module, moved, 0)))
+            if not new_lines and indent:
+                new_lines = [indent + "pass"]
+            edits.append((node.lineno, node.end_lineno, new_lines))
+        elif drop_max_examples and isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef)
+        ):
+            for decorator in node.decorator_list:
+                if is_max_examples_settings(decorator):
+                    edits.append((decorator.lineno, decorator.end_lineno, []))
+    return replace_lines(code, edits)
@@ -0,0 +1,193 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from PBTFactory.code_under_test import code_under_test
+from PBTFactory.cut_data import CUT_data
+from PBTFactory.eval_code import eval_with_mutmut
+from PBTFactory.kill_history import load_kill_log
+
+
+def cut_fingerprint(cut: code_under_test) -> str:
+    data = f"{cut.module}\n{cut.start_line}\n{cut.end_line}\n{cut.function_body}"
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def get_baseline_path(baseline_dir, cut: code_under_test) -> str:
+    return os.path.join(baseline_dir, cut.id, "baseline.json")
+
+
+def load_baseline(baseline_dir, cut: code_under_test):
+    path = get_baseline_path(baseline_dir, cut)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline["fingerprint"] != cut_fingerprint(cut):
+        logging.warning(f"Mutant baseline of {cut.id} is outdated: {path}")
+        return None
+    return baseline
+
+
+def run_baseline_tests(cut_data: CUT_data, workdir, test_files: dict):
+    testdir = os.path.join(workdir, "tests")
+    resultdir = os.path.join(workdir, "result")
+    logdir = os.path.join(workdir, "log")
+    shutil.rmtree(testdir, ignore_errors=True)
+    shutil.rmtree(resultdir, ignore_errors=True)
+    for d in [testdir, resultdir, logdir]:
+        os.makedirs(d, exist_ok=True)
+    for name, src in test_files.items():
+        with open(os.path.join(testdir, name), "w") as f:
+            f.write(src)
+
+    eval_with_mutmut(
+        testdir,
+        cut_data.project_path,
+        cut_data.cut.module,
+        resultdir,
+        logdir,
+        cut_data.cut.start_line,
+        cut_data.cut.end_line + 1,
+        test_order="off",
+        timeout_msg=f"{cut_data.cut.id} timeout running mutant baseline",
+    )
+    kill_log = load_kill_log(os.path.join(resultdir, "kills.jsonl"))
+    return kill_log, load_report(resultdir)
+
+
+def load_report(resultdir):
+    """The mutmut report of an evaluation, None if there is none."""
+    path = os.path.join(resultdir, "report.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        results = json.load(f)
+    return results[0] if results else None
+
+
+def get_killed_keys(kill_log: list, report: dict, mutants=None):
+    """
+    Keys of the mutants that mutmut counts as killed (killed or suspicious,
+    timeouts count as survived). None if the kill log does not agree with the
+    report of mutmut, e.g. a timed out run wrote no record, then the keys
+    cannot replace the ids of mutmut.
+    """
+    if report is None:
+        return None
+    runs = [run for run in kill_log if run["mutant"] is not None]
+    if mutants is None:
+        mutants = {run["mutant"] for run in runs}
+    killed = {run["mutant"] for run in runs if run["killed_by"] is not None}
+    killed_count = len(report["killed_ids"]) + len(report["suspicious_ids"])
+    total = killed_count + len(report["survived_ids"]) + len(report["timeout_ids"])
+    if len(killed) != killed_count or len(mutants) != total:
+        return None
+    if not killed <= set(mutants):
+        return None
+    return killed
+
+
+def save_baseline(cut_data: CUT_data, baseline_dir, kill_log, report):
+    """
+    Save the mutants of a run as the baseline, None if they do not agree with
+    mutmut. The baseline only gives the mutants stable keys across evaluations,
+    which tests of the run killed them is not kept.
+    """
+    if get_killed_keys(kill_log, report) is None:
+        return None
+    mutants = {
+        run["mutant"]: run["line"] for run in kill_log if run["mutant"] is not None
+    }
+    baseline = {
+        "filename": cut_data.cut.id,
+        "fingerprint": cut_fingerprint(cut_data.cut),
+        "mutants": mutants,
+    }
+    with open(get_baseline_path(baseline_dir, cut_data.cut), "w") as f:
+        json.dump(baseline, f)
+    return baseline
+
+
+def get_given_tests_dir(given_tests_dir, cut: code_under_test) -> str:
+    """The given tests of a CUT are in `<given_tests_dir>/<cut id>`."""
+    if not given_tests_dir:
+        return ""
+    path = os.path.join(given_tests_dir, cut.id)
+    return path if os.path.isdir(path) else ""
+
+
+def create_baseline(cut_data: CUT_data, baseline_dir, given_tests_dir):
+    """
+    Generate the mutants of one CUT with a run of its given tests, once.
+    Returns None if the kill log of the run does not agree with mutmut.
+    """
+    test_files = {}
+    for name in sorted(os.listdir(given_tests_dir)):
+        if name.startswith("test") and name.endswith(".py"):
+            with open(os.path.join(given_tests_dir, name)) as f:
+                test_files[name] = f.read()
+    workdir = os.path.join(baseline_dir, cut_data.cut.id)
+    kill_log, report = run_baseline_tests(cut_data, workdir, test_files)
+    baseline = save_baseline(cut_data, baseline_dir, kill_log, report)
+    if baseline is None:
+        logging.warning(
+            f"Given tests did not produce a mutant baseline for {cut_data.cut.id}, it is taken from the first evaluation"
+        )
+    return baseline
+
+
+def lock_baseline(baseline_dir, cut: code_under_test):
+    os.makedirs(os.path.join(baseline_dir, cut.id), exist_ok=True)
+    lock = open(os.path.join(baseline_dir, cut.id, "baseline.lock"), "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+
+def get_or_create_baseline(cut_data: CUT_data, baseline_dir, given_tests_dir=""):
+    """
+    Run the given tests of a CUT (`<given_tests_dir>/<cut id>`) once for all
+    pipelines and rounds, a file lock keeps it to one run per CUT. CUTs without
+    given tests get their baseline from their first evaluation instead, see
+    `baseline_from_eval`, so no extra mutmut run is needed.
+    """
+    given_tests_dir = get_given_tests_dir(given_tests_dir, cut_data.cut)
+    if not given_tests_dir:
+        return None
+    with lock_baseline(baseline_dir, cut_data.cut):
+        baseline = load_baseline(baseline_dir, cut_data.cut)
+        if baseline is None:
+            logging.info(f"Creating mutant baseline for {cut_data.cut.id}")
+            baseline = create_baseline(cut_data, baseline_dir, given_tests_dir)
+    return baseline
+
+
+def baseline_from_eval(cut_data: CUT_data, baseline_dir, kill_log, report):
+    """The baseline of the CUT, saved from this evaluation if there is none yet."""
+    with lock_baseline(baseline_dir, cut_data.cut):
+        baseline = load_baseline(baseline_dir, cut_data.cut)
+        if baseline is None:
+            baseline = save_baseline(cut_data, baseline_dir, kill_log, report)
+    return baseline
+
+
+def apply_baseline(result: dict, baseline: dict, kill_log: list) -> dict:
+    """
+    Express the result of one evaluation with the mutant keys of the baseline.
+    The sets follow the classification of mutmut (suspicious is killed, timeout
+    is survived); the result keeps the ids of mutmut if its kill log does not
+    agree with the report or the mutants of the baseline.
+    """
+    killed = get_killed_keys(kill_log, result, baseline["mutants"])
+    if killed is None:
+        logging.warning(
+            f"Kill log of {baseline['filename']} does not match the mutmut report or the baseline, keeping the mutmut ids"
+        )
+        return result
+    result["baseline"] = baseline["fingerprint"]
+    result["killed_keys"] = sorted(killed)
+    result["survived_keys"] = sorted(set(baseline["mutants"]) - killed)
+    return result
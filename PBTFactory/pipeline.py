@@ -1,20 +1,56 @@
+import concurrent.futures
 import json
 import logging
 import os
+import shutil
+import threading
+import typing as T
 
+from PBTFactory.auto_repair import repair_code
 from PBTFactory.chat import Chat
 from PBTFactory.cut_data import CUT_data
+from PBTFactory.dedup import deduplicate_tests
+from PBTFactory.error_context import condense_error
+from PBTFactory.error_triage import classify_error, is_semantic_failure
 from PBTFactory.eval_code import (
     ERROR_READING_REPORT,
     NO_MUTANTS,
     NO_REPORT,
     NO_TESTS,
     TEST_ERROR,
+    EVAL_WITH_MUTMUT_TIMEOUT,
+    RUN_PYTEST_TIMEOUT,
     TIMEOUT,
+    TIMEOUT_MULTIPLIER,
+    adaptive_timeout,
     eval_with_mutmut,
 )
-from PBTFactory.message import MessageManager, count_code
+from PBTFactory.kill_history import (
+    copy_kill_history,
+    get_killed_by,
+    load_kill_log,
+    update_kill_history,
+)
+from PBTFactory.kill_matrix import (
+    build_kill_matrix,
+    get_existing_tests,
+    minimize_tests,
+    write_minimal_suite,
+)
+from PBTFactory.message import MessageManager, extract_code, normalize_imports
+from PBTFactory.mutant_baseline import (
+    apply_baseline,
+    baseline_from_eval,
+    load_baseline,
+)
 from PBTFactory.request_manager import RequestType
+from PBTFactory.static_check import check_code
+
+# Names the generated code has to define, see message.extract_code
+STRATEGY_NAMES = ("strategy_function",)
+TEST_NAMES = ("test*",)
+MAX_REPAIRS = 3
+PYTEST_TIMEOUT_FLOOR = 120
 
 
 class FileNotFoundError(Exception):
@@ -33,6 +69,9 @@ class IPipeline:
 
 
 class Pipeline(IPipeline):
+    # Runs the streamed evaluations of all pipelines, see stream_eval
+    stream_executor: T.Optional[concurrent.futures.Executor] = None
+
     def __init__(
         self,
         cut_data: CUT_data,
@@ -40,20 +79,67 @@ class Pipeline(IPipeline):
         max_fix: int,
         max_hypothesis_examples: int,
         system_message: str,
+        eval_hypothesis_examples: int = 0,
+        eval_hypothesis_shrink: bool = False,
+        test_order: str = "mutant",
+        kill_history_dir: str = "",
+        baseline_dir: str = "",
+        eval_tmpfs_mb: int = 0,
+        incremental_eval: bool = False,
+        early_stop_score: float = 0,
+        adaptive_timeouts: bool = True,
+        dedup_tests: bool = False,
+        kill_matrix: str = "first_kill",
+        static_check: bool = True,
+        auto_repair: bool = True,
+        triage_policy: str = "off",
+        fix_error_tokens: int = 0,
+        batch_property_check: bool = False,
+        strategy_synthesis: bool = False,
+        strategy_store_dir: str = "",
+        explanation_cache: str = "off",
+        explanation_cache_dir: str = "",
+        explanation_cache_tag: str = "",
     ):
 
         self.cut_data = cut_data
         self.max_retry = max_retry
         self.max_fix = max_fix
         self.max_hypothesis_examples = max_hypothesis_examples
+        # the generation budget unless a smaller one is set for mutation testing
+        self.eval_hypothesis_examples = (
+            eval_hypothesis_examples or max_hypothesis_examples
+        )
+        self.eval_hypothesis_shrink = eval_hypothesis_shrink
+        self.test_order = test_order
+        self.kill_history_dir = kill_history_dir
+        self.baseline_dir = baseline_dir
+        self.eval_tmpfs_mb = eval_tmpfs_mb
+        self.incremental_eval = incremental_eval
+        self.early_stop_score = early_stop_score
+        self.adaptive_timeouts = adaptive_timeouts
+        self.dedup_tests = dedup_tests
+        self.kill_matrix = kill_matrix
+        self.static_check = static_check
+        self.auto_repair = auto_repair
+        self.triage_policy = triage_policy
+        self.fix_error_tokens = fix_error_tokens
+        self.batch_property_check = batch_property_check
+        self.strategy_synthesis = strategy_synthesis
+        self.strategy_store_dir = strategy_store_dir
+        self.explanation_cache = explanation_cache
+        self.explanation_cache_dir = explanation_cache_dir
+        self.explanation_cache_tag = explanation_cache_tag
         self.failed_count = 0
+        self.stream_futures = []
+        self.stream_lock = threading.Lock()
 
         if "." in self.cut_data.cut.entry_point:
             self.import_name = self.cut_data.cut.entry_point.split(".")[0]
         else:
             self.import_name = self.cut_data.cut.entry_point
 
-        self.chat = Chat(self.cut_data.logdir, system_message)
+        self.chat = Chat(self.cut_data.logdir, system_message, self.cut_data.cut.test)
 
         os.makedirs(os.path.join(self.cut_data.logdir, "msg"), exist_ok=True)
         os.makedirs(os.path.join(self.cut_data.logdir, "fail"), exist_ok=True)
@@ -64,6 +150,7 @@ class Pipeline(IPipeline):
         err_msg: str,
         extra_msg: str = "",
         step_name="fix_code",
+        required_names=(),
     ):
         err_msg_tmp = []
         for line in err_msg.split("\n"):
@@ -71,14 +158,25 @@ class Pipeline(IPipeline):
                 err_msg_tmp = []
             err_msg_tmp.append(line)
         err_msg = "\n".join(err_msg_tmp)
+        if self.fix_error_tokens:
+            err_msg = condense_error(err_msg, self.fix_error_tokens)
         prompt = f"""Fix the error in the code. Explain what caused the error. Andxplain what you changed and why. Think step by step. Write your thought first. Show me full code after fix, do not omit any code, do not use placeholder.\n{extra_msg}\n{err_msg}"""
         mm.add_user_message(prompt)
         msg = self.chat.ask(mm, step_name)
         mm.add_assistant_message(msg)
-        if count_code(msg) != 1:
+        if extract_code(msg, required_names) is None:
             return self.ask_for_code_only(mm)
         return msg
 
+    def normalize_code(self, code, drop_names=(), drop_max_examples=False):
+        return normalize_imports(
+            code,
+            self.cut_data.cut.module,
+            self.import_name,
+            drop_names,
+            drop_max_examples,
+        )
+
     def ask_for_code_only(self, mm: MessageManager):
         mm2 = mm.copy()
         prompt = "You are correct. Base on above, collect the code only. Do not include the explanation. Give me one code block only."
@@ -87,6 +185,90 @@ class Pipeline(IPipeline):
         mm2.add_assistant_message(msg)
         return msg
 
+    def check_generated_code(self, filename, **kwargs) -> str:
+        """
+        Static checks of a generated file before it is run in a container, see
+        static_check.check_code. Returns the error message, "" if there is none.
+        """
+        if not self.static_check:
+            return ""
+        err = check_code(
+            filename, self.cut_data.project_path, self.cut_data.cut.module, **kwargs
+        )
+        if err:
+            with open(os.path.join(self.cut_data.logdir, "static_check.log"), "a") as f:
+                f.write(f"{os.path.basename(filename)}:\n{err}\n\n")
+        return err
+
+    def record_repairs(self, repairs, passed):
+        path = os.path.join(self.cut_data.logdir, "auto_repair.json")
+        stats = {"repairs": {}, "passed": 0, "failed": 0, "llm_calls_saved": 0}
+        if os.path.exists(path):
+            with open(path) as f:
+                stats = json.load(f)
+        for category, _ in repairs:
+            stats["repairs"][category] = stats["repairs"].get(category, 0) + 1
+        if passed:
+            stats["passed"] += 1
+            # the fix request the failure would have needed
+            stats["llm_calls_saved"] += 1
+        else:
+            stats["failed"] += 1
+        with open(path, "w") as f:
+            json.dump(stats, f, indent=4)
+
+    def record_triage(self, property_name, **counts):
+        """Add to the triage counts of a property type in triage.json."""
+        path = os.path.join(self.cut_data.logdir, "triage.json")
+        stats = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                stats = json.load(f)
+        property_stats = stats.setdefault(property_name, {})
+        for key, value in counts.items():
+            property_stats[key] = property_stats.get(key, 0) + value
+        with open(path, "w") as f:
+            json.dump(stats, f, indent=4)
+
+    def should_stop_fixing(self, logs_err) -> bool:
+        return self.triage_policy != "off" and is_semantic_failure(logs_err)
+
+    def repair_and_rerun(self, mm: MessageManager, code, result, run):
+        """
+        Apply the rule based repairs of auto_repair.repair_code to code that failed
+        and run it again, before the error goes to the LLM. `run(code)` returns
+        (exit_code, logs, logs_err). The conversation is updated with the repaired
+        code. Returns the result of the last run and the code that produced it.
+        """
+        exit_code, logs, logs_err = result
+        if not self.auto_repair or exit_code == 0:
+            return exit_code, logs, logs_err, code
+        repairs = []
+        for _ in range(MAX_REPAIRS):
+            failure = classify_error(logs_err)
+            repaired, description = repair_code(
+                code,
+                failure,
+                logs_err,
+                self.cut_data.cut.module,
+                self.cut_data.project_path,
+            )
+            if repaired is None:
+                break
+            repairs.append((failure.category, description))
+            mm.replace_content(code, repaired)
+            code = repaired
+            exit_code, logs, logs_err = run(code)
+            if exit_code == 0:
+                break
+        if repairs:
+            with open(os.path.join(self.cut_data.logdir, "auto_repair.log"), "a") as f:
+                for category, description in repairs:
+                    f.write(f"{category}: {description}\n")
+                f.write(f"{'passed' if exit_code == 0 else 'failed'}\n\n")
+            self.record_repairs(repairs, exit_code == 0)
+        return exit_code, logs, logs_err, code
+
     def have_finished(self) -> bool:
         path_to_parsed_report = os.path.join(
             self.cut_data.resultdir, "parsed_report.json"
@@ -95,7 +277,169 @@ class Pipeline(IPipeline):
             return True
         return False
 
+    def load_test_durations(self) -> dict:
+        path = os.path.join(self.cut_data.logdir, "timings.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def record_test_duration(self, filename, seconds):
+        """Duration of one passing run of a generated test, used for the timeouts."""
+        durations = self.load_test_durations()
+        durations[os.path.basename(filename)] = seconds
+        with open(os.path.join(self.cut_data.logdir, "timings.json"), "w") as f:
+            json.dump(durations, f)
+
+    def pytest_timeout(self, filename, repeat=1):
+        """
+        From the last passing run of the same test file. None keeps the fixed
+        timeout of run_pytest, also for a file that has not passed yet.
+        """
+        if not self.adaptive_timeouts:
+            return None
+        duration = self.load_test_durations().get(os.path.basename(filename))
+        if duration is None:
+            return None
+        return adaptive_timeout(
+            duration * repeat,
+            TIMEOUT_MULTIPLIER,
+            PYTEST_TIMEOUT_FLOOR * repeat,
+            RUN_PYTEST_TIMEOUT * repeat,
+        )
+
+    def mutmut_timeout(self):
+        """
+        Every mutant runs the suite at most once more, plus the clean runs. Needs
+        the mutant count of the baseline, otherwise the fixed timeout is used.
+        """
+        durations = self.load_test_durations()
+        baseline = None
+        if self.adaptive_timeouts and self.baseline_dir:
+            baseline = load_baseline(self.baseline_dir, self.cut_data.cut)
+        if not durations or not baseline:
+            return EVAL_WITH_MUTMUT_TIMEOUT
+        return adaptive_timeout(
+            sum(durations.values()) * (len(baseline["mutants"]) + 2),
+            TIMEOUT_MULTIPLIER,
+            600,
+            EVAL_WITH_MUTMUT_TIMEOUT,
+        )
+
+    def load_stream_state(self) -> dict:
+        path = os.path.join(self.cut_data.resultdir, "stream_state.json")
+        if not os.path.exists(path):
+            return {"killed": {}, "mutants": []}
+        with open(path) as f:
+            return json.load(f)
+
+    def stream_score(self, state: dict) -> float:
+        baseline = None
+        if self.baseline_dir:
+            baseline = load_baseline(self.baseline_dir, self.cut_data.cut)
+        mutants = baseline["mutants"] if baseline else state["mutants"]
+        if not mutants:
+            return 0.0
+        return len(set(state["killed"]) & set(mutants)) / len(mutants)
+
+    def stream_eval(self, test_path):
+        """
+        Queue one new passing test for evaluation against the mutants that
+        survived the tests accepted so far. It runs on stream_executor while the
+        generation goes on, eval_test waits for the queued evaluations.
+        """
+        name = os.path.splitext(os.path.basename(test_path))[0]
+        workdir = os.path.join(self.cut_data.logdir, "stream", name)
+        testdir = os.path.join(workdir, "tests")
+        shutil.rmtree(workdir, ignore_errors=True)
+        os.makedirs(testdir)
+        os.makedirs(os.path.join(workdir, "result"))
+        shutil.copy(test_path, testdir)
+        if self.stream_executor is None:
+            self.run_stream_eval(name, workdir)
+            return
+        self.stream_futures.append(
+            self.stream_executor.submit(self.run_stream_eval, name, workdir)
+        )
+
+    def run_stream_eval(self, name, workdir) -> float:
+        """
+        Evaluate a queued test and merge its kills. The evaluations of one CUT
+        run one at a time, each skips the mutants killed so far. Returns the
+        mutation score so far.
+        """
+        with self.stream_lock:
+            return self._run_stream_eval(name, workdir)
+
+    def _run_stream_eval(self, name, workdir) -> float:
+        state = self.load_stream_state()
+        testdir = os.path.join(workdir, "tests")
+        resultdir = os.path.join(workdir, "result")
+        eval_with_mutmut(
+            testdir,
+            self.cut_data.project_path,
+            self.cut_data.cut.module,
+            resultdir,
+            workdir,
+            self.cut_data.cut.start_line,
+            self.cut_data.cut.end_line + 1,
+            hypothesis_examples=self.eval_hypothesis_examples,
+            hypothesis_shrink=self.eval_hypothesis_shrink,
+            test_order=self.test_order,
+            tmpfs_mb=self.eval_tmpfs_mb,
+            skip_mutants=state["killed"],
+            timeout=self.mutmut_timeout(),
+            adaptive_test_timeout=self.adaptive_timeouts,
+            timeout_msg=f"{self.cut_data.cut.id} timeout running mutmut on {name}",
+        )
+
+        mutants = set(state["mutants"])
+        for run in load_kill_log(os.path.join(resultdir, "kills.jsonl")):
+            if run["mutant"] is None:
+                continue
+            mutants.add(run["mutant"])
+            if run["killed_by"] is not None and not run.get("skipped"):
+                state["killed"].setdefault(run["mutant"], run["killed_by"])
+        state["mutants"] = sorted(mutants)
+        # should_stop_early reads the state from the generation thread
+        path = os.path.join(self.cut_data.resultdir, "stream_state.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+        score = self.stream_score(state)
+        logging.info(
+            f"{self.cut_data.cut.id}: {name} streamed, score so far {score:.2f}"
+        )
+        return score
+
+    def wait_stream_evals(self):
+        for future in self.stream_futures:
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error in streamed evaluation:\n{e}")
+        self.stream_futures = []
+
+    def should_stop_early(self) -> bool:
+        if not self.incremental_eval or self.early_stop_score <= 0:
+            return False
+        return self.stream_score(self.load_stream_state()) >= self.early_stop_score
+
+    def remove_duplicate_tests(self):
+        removed = deduplicate_tests(
+            self.cut_data.testdir,
+            os.path.join(self.cut_data.logdir, "duplicate_tests"),
+        )
+        with open(os.path.join(self.cut_data.logdir, "dedup.json"), "w") as f:
+            json.dump(removed, f, indent=4)
+        if removed:
+            logging.info(
+                f"{self.cut_data.cut.id}: removed {len(removed)} duplicate tests"
+            )
+
     def eval_test(self):
+        self.wait_stream_evals()
         tests = [
             x
             for x in os.listdir(self.cut_data.testdir)
@@ -114,6 +458,22 @@ class Pipeline(IPipeline):
                 json.dump(result, f)
             return result
 
+        if self.dedup_tests:
+            self.remove_duplicate_tests()
+
+        kill_log_path = os.path.join(self.cut_data.resultdir, "kills.jsonl")
+        if os.path.exists(kill_log_path):
+            os.remove(kill_log_path)
+        history_path = None
+        if self.kill_history_dir:
+            history_path = os.path.join(
+                self.kill_history_dir, f"{self.cut_data.cut.id}.json"
+            )
+            copy_kill_history(
+                history_path,
+                os.path.join(self.cut_data.resultdir, "kill_history.json"),
+            )
+
         try:
             e_code, log, err, _, timeouted = eval_with_mutmut(
                 self.cut_data.testdir,
@@ -123,6 +483,18 @@ class Pipeline(IPipeline):
                 self.cut_data.logdir,
                 self.cut_data.cut.start_line,
                 self.cut_data.cut.end_line + 1,
+                hypothesis_examples=self.eval_hypothesis_examples,
+                hypothesis_shrink=self.eval_hypothesis_shrink,
+                test_order=self.test_order,
+                tmpfs_mb=self.eval_tmpfs_mb,
+                skip_mutants=(
+                    self.load_stream_state()["killed"]
+                    if self.incremental_eval
+                    else None
+                ),
+                timeout=self.mutmut_timeout(),
+                adaptive_test_timeout=self.adaptive_timeouts,
+                full_kill_matrix=self.kill_matrix == "full",
                 timeout_msg=f"{self.cut_data.cut.id} timeout running mutmut",
             )
         except Exception as e:
@@ -156,6 +528,17 @@ class Pipeline(IPipeline):
                     else:
                         result = results[0]
                         result["untested_ids"] = None  # remove untested_ids
+                        kill_log = load_kill_log(kill_log_path)
+                        result["killed_by"] = get_killed_by(kill_log)
+                        baseline = None
+                        if self.baseline_dir:
+                            baseline = baseline_from_eval(
+                                self.cut_data, self.baseline_dir, kill_log, result
+                            )
+                        if baseline:
+                            apply_baseline(result, baseline, kill_log)
+                        if self.kill_matrix != "off":
+                            result["minimal_suite"] = self.write_kill_matrix(kill_log)
             except Exception as e:
                 result = {
                     "error": "Error reading report.json",
@@ -168,6 +551,14 @@ class Pipeline(IPipeline):
         if os.path.exists(coverage_file_path):
             result["coverage"] = self.parse_coverage(coverage_file_path)
 
+        clean_run_path = os.path.join(self.cut_data.resultdir, "clean_run.json")
+        if os.path.exists(clean_run_path):
+            with open(clean_run_path) as f:
+                result["clean_run_duration"] = json.load(f)["duration"]
+
+        if history_path:
+            update_kill_history(history_path, kill_log_path)
+
         result["filename"] = self.cut_data.cut.id
         with open(
             os.path.join(self.cut_data.resultdir, "parsed_report.json"), "w"
@@ -176,6 +567,53 @@ class Pipeline(IPipeline):
 
         return result
 
+    def write_kill_matrix(self, kill_log) -> dict:
+        """
+        Save the kill matrix of the evaluation and the smallest set of tests
+        found that kills the same mutants, in kill_matrix.json and minimal_tests.
+        """
+        durations = {}
+        clean_run_path = os.path.join(self.cut_data.resultdir, "clean_run.json")
+        if os.path.exists(clean_run_path):
+            with open(clean_run_path) as f:
+                durations = json.load(f)["tests"]
+        duplicates = {}
+        dedup_path = os.path.join(self.cut_data.logdir, "dedup.json")
+        if self.dedup_tests and os.path.exists(dedup_path):
+            with open(dedup_path) as f:
+                duplicates = {r["test"]: r["duplicate_of"] for r in json.load(f)}
+        matrix = build_kill_matrix(
+            kill_log,
+            durations,
+            complete=self.kill_matrix == "full",
+            tests=get_existing_tests(self.cut_data.testdir),
+            duplicates=duplicates,
+        )
+        if matrix["unknown_tests"]:
+            logging.warning(
+                f"{self.cut_data.cut.id}: kills of tests that are not in the test folder are left out of the kill matrix: {matrix['unknown_tests']}"
+            )
+        selected = minimize_tests(matrix)
+        matrix["minimal_tests"] = selected
+        with open(os.path.join(self.cut_data.resultdir, "kill_matrix.json"), "w") as f:
+            json.dump(matrix, f)
+
+        minimal_dir = os.path.join(self.cut_data.resultdir, "minimal_tests")
+        if os.path.exists(minimal_dir):
+            shutil.rmtree(minimal_dir)
+        missing = write_minimal_suite(self.cut_data.testdir, selected, minimal_dir)
+        if missing:
+            logging.error(
+                f"{self.cut_data.cut.id}: tests of the minimal suite not found: {missing}"
+            )
+        test_durations = dict(zip(matrix["tests"], matrix["durations"]))
+        return {
+            "tests": len(selected),
+            "total_tests": len(matrix["tests"]),
+            "duration": sum(test_durations[test] for test in selected),
+            "total_duration": sum(durations.values()),
+        }
+
     def parse_coverage(self, coverage_file_path):
         with open(coverage_file_path, "r") as f:
             coverage = json.load(f)
@@ -1,12 +1,32 @@
+import json
 import os
 import textwrap
 
 from PBTFactory.chat import Chat
 from PBTFactory.cut_data import CUT_data
-from PBTFactory.eval_code import run_code, run_pytest
-from PBTFactory.message import MessageManager, count_code, find_code, replace_code
-from PBTFactory.pipeline import Pipeline
+from PBTFactory.eval_code import STALL_TIMEOUT, run_code, run_pytest
+from PBTFactory.explanation_cache import (
+    explanation_key,
+    lock_explanation,
+    load_explanation,
+    save_explanation,
+)
+from PBTFactory.message import MessageManager, extract_code, find_code, replace_code
+from PBTFactory.pipeline import STRATEGY_NAMES, TEST_NAMES, Pipeline
 from PBTFactory.request_manager import RequestType
+from PBTFactory.strategy_store import (
+    HIT,
+    INVALID,
+    MISS,
+    fingerprint,
+    load_strategy,
+    remove_strategy,
+    save_strategy,
+    update_store_stats,
+)
+from PBTFactory.strategy_synthesis import synthesize_strategy
+
+INSTANCE_STRATEGY_NAMES = ("instance_strategy",)
 
 suffix = "The function may not have exact property. However, as long as the function is close to the property, it is acceptable or it is meaning to check. You need to say yes and reason about the function and the property."
 # Some copyed from F# by ScottW.
@@ -82,6 +102,30 @@ property_list = [
 for p in property_list:
     p["explain"] += f" {suffix}"
 
+PROPERTY_VERDICTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "properties": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "rationale": {"type": "string"},
+                    "applicable": {"type": "boolean"},
+                },
+                "required": ["name", "rationale", "applicable"],
+            },
+        }
+    },
+    "required": ["properties"],
+}
+HAS_PROPERTY_SCHEMA = {
+    "type": "object",
+    "properties": {"has_property": {"type": "boolean"}},
+    "required": ["has_property"],
+}
+
 
 def create_ask_info_prompt(
     function_name: str, function: str, test: str, class_structure: str
@@ -111,6 +155,35 @@ def create_ask_info_prompt(
     return template
 
 
+def create_ask_class_info_prompt(classname: str, class_structure: str, cuts) -> str:
+    methods = "".join(
+        f"Method `{cut.entry_point}`:\n```python\n{cut.function_body}\n```\n\n"
+        for cut in cuts
+    )
+    if class_structure:
+        class_structure = f"Class Structure:\n```python\n{class_structure}\n```\n\n"
+    template = textwrap.dedent(
+        """\
+        What is the class `{}` doing? The methods under test are {}.
+        First write down what you think about the class, what you think about each method under test.
+        You should write down your thought process.
+        The answer should follow the format:
+        **Initial Thoughts**
+        **Analyzing the Class**
+        **Analyzing the Methods**
+        **More Thoughts**
+        **Putting it Together**
+
+        {}{}"""
+    ).format(
+        classname,
+        ", ".join(f"`{cut.entry_point}`" for cut in cuts),
+        class_structure,
+        methods,
+    )
+    return template
+
+
 def ask_create_strategy_prompt(cut, code_explanation):
     function_body = cut.function_body
     if function_body:
@@ -177,6 +250,41 @@ def create_ask_properties_prompt(
     return template
 
 
+def create_check_properties_prompt(
+    function_name: str, function: str, test: str, property_list, code_explanation
+) -> str:
+    properties = "\n".join(
+        f"- {property_dict['name']}: {property_dict['explain']}"
+        for property_dict in property_list
+    )
+    template = textwrap.dedent(
+        """\
+        You are a software engineer working on a project that involves testing a function called `{}`.
+        Function:
+        ```python
+        {}
+        ```
+        Test:
+        ```python
+        {}
+        ```
+        Code Explanation:
+        {}
+
+        Question:
+        For each of the following properties, does `{}` have the property?
+        {}
+        This function many not have some of the properties.
+        For each property, give a short rationale first, then set applicable to true if the function has the property, false if it does not.
+        Answer in JSON only, with one entry per property and the names as given above, in the format:
+        ```json
+        {{"properties": [{{"name": _, "rationale": _, "applicable": true}}, ...]}}
+        ```
+        """
+    ).format(function_name, function, test, code_explanation, function_name, properties)
+    return template
+
+
 class pipeline_PBTFactory(Pipeline):
 
     def __init__(
@@ -188,23 +296,38 @@ class pipeline_PBTFactory(Pipeline):
         max_fix=3,
         max_hypothesis_examples=350,
         system_message: str = None,
+        **kwargs,
     ):
         super().__init__(
-            cut_data, max_retry, max_fix, max_hypothesis_examples, system_message
+            cut_data,
+            max_retry,
+            max_fix,
+            max_hypothesis_examples,
+            system_message,
+            **kwargs,
         )
 
         self.max_strategy_retry = max_strategy_retry
         self.max_strategy_fix = max_strategy_fix
+        self.strategy_lookup = MISS
 
     def run(self):
-        code_explanation = self.ask_for_code_explanation(MessageManager())
-
+        code_explanation = self.get_code_explanation()
+
+        strategy_msg = None
+        if self.strategy_store_dir:
+            strategy_msg = self.load_stored_strategy()
+        if strategy_msg is None and self.strategy_synthesis:
+            strategy_msg = self.synthesize_strategy()
+        bug_free = strategy_msg is not None
         for i in range(self.max_strategy_retry):
+            if bug_free:
+                break
             bug_free, strategy_msg, logs, err = self.create_strategy(
                 MessageManager(), code_explanation
             )
-            if bug_free:
-                break
+        if self.strategy_store_dir:
+            self.store_strategy(strategy_msg if bug_free else None)
 
         if not bug_free:
             with open(f"{self.cut_data.logdir}/strategy.log", "w") as f:
@@ -212,12 +335,24 @@ class pipeline_PBTFactory(Pipeline):
             return self.chat.total_time
 
         property_list = self.get_property_list(code_explanation)
+        verdicts = {}
+        if self.batch_property_check:
+            verdicts = self.check_properties(code_explanation, property_list)
         for i in range(len(property_list)):
+            if self.should_stop_early():
+                with open(f"{self.cut_data.logdir}/early_stop.log", "w") as f:
+                    f.write(
+                        f"Skipped {[p['name'] for p in property_list[i:]]}, score reached {self.early_stop_score}"
+                    )
+                break
+            if verdicts.get(property_list[i]["name"]) is False:
+                continue
             self.create_pbt(
                 MessageManager(),
                 code_explanation,
                 property_list[i],
                 strategy_msg,
+                confirmed=property_list[i]["name"] in verdicts,
             )
 
         return self.chat.total_time
@@ -225,6 +360,175 @@ class pipeline_PBTFactory(Pipeline):
     def get_property_list(self, code_explanation):
         return property_list
 
+    def check_properties(self, code_explanation, property_list) -> dict:
+        """
+        Ask in one request which properties the function has. Returns the
+        verdict of each property name, properties without a verdict are checked
+        one by one in create_pbt.
+        """
+        prompt = create_check_properties_prompt(
+            self.cut_data.cut.entry_point,
+            self.cut_data.cut.function_body,
+            self.cut_data.cut.test,
+            property_list,
+            code_explanation,
+        )
+        mm = MessageManager()
+        mm.add_user_message(prompt)
+        msg_count = self.chat.msg_count
+        data = self.chat.ask(
+            mm, "check_properties", output_schema=PROPERTY_VERDICTS_SCHEMA
+        )
+        names = [property_dict["name"] for property_dict in property_list]
+        answers = data["properties"] if data else []
+        verdicts = {a["name"]: a["applicable"] for a in answers if a["name"] in names}
+
+        # a reasoning and a check request per property, reasoning of applicable ones
+        requests = self.chat.msg_count - msg_count
+        saved = 2 * len(verdicts) - requests - sum(verdicts.values())
+        with open(os.path.join(self.cut_data.logdir, "property_check.json"), "w") as f:
+            json.dump({"verdicts": answers, "llm_calls_saved": saved}, f, indent=4)
+        return verdicts
+
+    def get_code_explanation(self):
+        """
+        The explanation of the function, from the explanation cache if enabled,
+        or of its class if the function is a method of a class group.
+        """
+        if self.cut_data.group is not None:
+            return self.prepare_class_group()
+        if self.explanation_cache == "off":
+            return self.ask_for_code_explanation(MessageManager())
+        key = explanation_key(self.cut_data.cut, self.explanation_cache_tag)
+        with lock_explanation(self.explanation_cache_dir, key):
+            code_explanation = load_explanation(self.explanation_cache_dir, key)
+            hit = code_explanation is not None
+            if not hit:
+                code_explanation = self.ask_for_code_explanation(MessageManager())
+                save_explanation(
+                    self.explanation_cache_dir, key, self.cut_data.cut, code_explanation
+                )
+        path = os.path.join(self.cut_data.logdir, "explanation_cache.json")
+        with open(path, "w") as f:
+            json.dump({"hit": hit, "key": key}, f, indent=4)
+        return code_explanation
+
+    def prepare_class_group(self):
+        """
+        Create the explanation and the instance strategy of the class group of
+        the method if no other member has yet, otherwise wait for them. Returns
+        the explanation, the one of the method if the group has none.
+        """
+        group = self.cut_data.group
+        reused = not group.claim()
+        if reused:
+            group.prepared.wait()
+        else:
+            try:
+                mm = MessageManager()
+                group.explanation = self.ask_for_class_explanation(mm, group)
+                group.instance_strategy = self.create_instance_strategy(mm, group)
+            finally:
+                group.prepared.set()
+        path = os.path.join(self.cut_data.logdir, "class_group.json")
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "group": str(group),
+                    "members": [cut_data.cut.id for cut_data in group.members],
+                    "reused": reused,
+                    "instance_strategy": bool(group.instance_strategy),
+                },
+                f,
+                indent=4,
+            )
+        if group.explanation is None:
+            return self.ask_for_code_explanation(MessageManager())
+        return group.explanation
+
+    def ask_for_class_explanation(self, mm: MessageManager, group):
+        prompt = create_ask_class_info_prompt(
+            group.classname,
+            self.cut_data.cut.class_structure,
+            [cut_data.cut for cut_data in group.members],
+        )
+        mm.add_user_message(prompt)
+        msg = self.chat.ask(mm, "ask_class_info")
+        mm.add_assistant_message(msg)
+        mm.add_user_message(
+            textwrap.dedent(
+                """\
+                Now collect your thoughts, and give me a complete summary of the class and of each method under test. Your summary should include the following:
+                **Class Summary**
+                **How to Create an Instance**
+                For each method:
+                **Input:**
+                **Output:**
+                **Behavior:**
+                **Example Usage**
+                """
+            )
+        )
+        msg = self.chat.ask(mm, "ask_class_info_summary")
+        mm.add_assistant_message(msg)
+        return msg
+
+    def create_instance_strategy(self, mm: MessageManager, group) -> str:
+        """
+        A validated `instance_strategy` that draws instances of the class, ""
+        if it could not be created.
+        """
+        prompt = textwrap.dedent(
+            f"""\
+            Now, use python hypothesis to create a strategy that constructs instances of `{group.classname}`. Make sure the name of function is `instance_strategy`.
+            The instances should be diverse and valid, so that every method under test can be called on them. When creating complex object, use helper function.
+            Think step by step. Write your thought first. Make sure to consider what the constructor is expecting for each parameter.
+            When coding, give me the strategy function only and only use one code block. The strategy function should start with
+            ```python
+            Other imports
+            import hypothesis.strategies as st
+            from {group.module} import {group.classname} #  Do not change this line
+
+            @st.composite
+            def instance_strategy(draw):
+            ```
+            """
+        )
+        mm.add_user_message(prompt)
+        msg = self.chat.ask(mm, "create_instance_strategy")
+        mm.add_assistant_message(msg)
+
+        def run(code):
+            # test_strategy draws from strategy_function
+            wrapper = "\n\n@st.composite\ndef strategy_function(draw):\n    return draw(instance_strategy())\n"
+            return self.test_strategy(
+                f"{self.cut_data.testdir}/instance_strategy.py", code + wrapper
+            )
+
+        for i in range(self.max_strategy_fix + 1):
+            if i > 0:
+                msg = self.ask_fix_code(
+                    mm,
+                    logs_err,
+                    "Do not change anything other than instance_strategy.",
+                    "fix_code_instance_strategy",
+                    INSTANCE_STRATEGY_NAMES,
+                )
+            code = find_code(msg, INSTANCE_STRATEGY_NAMES)
+            exit_code, logs, logs_err = run(code)
+            if exit_code == 0:
+                return code
+        return ""
+
+    def with_instance_strategy(self, code):
+        """Add the instance strategy of the class group if code uses it."""
+        group = self.cut_data.group
+        if group is None or not group.instance_strategy:
+            return code
+        if "instance_strategy" not in code or "def instance_strategy" in code:
+            return code
+        return f"{group.instance_strategy}\n\n\n{code}"
+
     def ask_for_code_explanation(self, mm: MessageManager):
         prompt = create_ask_info_prompt(
             self.cut_data.cut.entry_point,
@@ -253,13 +557,77 @@ class pipeline_PBTFactory(Pipeline):
         mm.add_assistant_message(msg)
         return msg
 
+    def load_stored_strategy(self):
+        """
+        The strategy stored for this function, as an answer with one code block,
+        if it still runs. None if there is none or it fails.
+        """
+        key = fingerprint(self.cut_data.cut)
+        code = load_strategy(self.strategy_store_dir, key)
+        self.strategy_lookup = MISS
+        if code is None:
+            return None
+        exit_code, logs, logs_err = self.test_strategy(
+            f"{self.cut_data.testdir}/strategy.py", code
+        )
+        if exit_code != 0:
+            self.strategy_lookup = INVALID
+            return None
+        self.strategy_lookup = HIT
+        return f"This strategy function was validated for this function before.\n```python\n{code}\n```\n"
+
+    def store_strategy(self, strategy_msg):
+        """Save a validated strategy and record the lookup in the stats."""
+        key = fingerprint(self.cut_data.cut)
+        stored = False
+        if strategy_msg is not None and self.strategy_lookup != HIT:
+            save_strategy(
+                self.strategy_store_dir, key, find_code(strategy_msg, STRATEGY_NAMES)
+            )
+            stored = True
+        elif strategy_msg is None and self.strategy_lookup == INVALID:
+            remove_strategy(self.strategy_store_dir, key)
+        update_store_stats(self.strategy_store_dir, self.strategy_lookup, stored)
+        path = os.path.join(self.cut_data.logdir, "strategy_store.json")
+        with open(path, "w") as f:
+            json.dump({"lookup": self.strategy_lookup, "stored": stored}, f, indent=4)
+
+    def synthesize_strategy(self):
+        """
+        The strategy built by strategy_synthesis, as an answer with one code
+        block, if it runs. None if it cannot be built or fails.
+        """
+        cut = self.cut_data.cut
+        code = synthesize_strategy(
+            cut.signature, cut.entry_point, cut.test, cut.module, self.import_name
+        )
+        result = {"synthesized": code is not None, "passed": False}
+        if code is not None:
+            exit_code, logs, logs_err = self.test_strategy(
+                f"{self.cut_data.testdir}/strategy.py", code
+            )
+            result["passed"] = exit_code == 0
+            if exit_code != 0:
+                result["error"] = logs_err
+        path = os.path.join(self.cut_data.logdir, "strategy_synthesis.json")
+        with open(path, "w") as f:
+            json.dump(result, f, indent=4)
+        if not result["passed"]:
+            return None
+        return f"The strategy function draws the parameters from their types, default values and the values used in the tests.\n```python\n{code}```\n"
+
     def create_strategy(self, mm: MessageManager, code_explanation):
         msg_first = self.ask_for_strategy(mm, code_explanation)
         msg = msg_first
         bug_free = False
 
-        exit_code, logs, logs_err = self.test_strategy(
-            f"{self.cut_data.testdir}/strategy.py", find_code(msg)
+        def run(code):
+            code = self.with_instance_strategy(code)
+            return self.test_strategy(f"{self.cut_data.testdir}/strategy.py", code)
+
+        code = find_code(msg, STRATEGY_NAMES)
+        exit_code, logs, logs_err, code = self.repair_and_rerun(
+            mm, code, run(code), run
         )
         if (not exit_code) and exit_code == 0:
             bug_free = True
@@ -271,16 +639,18 @@ class pipeline_PBTFactory(Pipeline):
                 logs_err,
                 "Do not change anything other than strategy function.",
                 "fix_code_strategy",
+                STRATEGY_NAMES,
             )
 
-            exit_code, logs, logs_err = self.test_strategy(
-                f"{self.cut_data.testdir}/strategy.py", find_code(msg)
+            code = find_code(msg, STRATEGY_NAMES)
+            exit_code, logs, logs_err, code = self.repair_and_rerun(
+                mm, code, run(code), run
             )
             if (not exit_code) and exit_code == 0:
                 bug_free = True
 
         if bug_free:
-            msg = replace_code(msg_first, find_code(msg))
+            msg = replace_code(msg_first, self.with_instance_strategy(code))
             return True, msg, logs, ""
         else:
             return False, msg, logs, logs_err
@@ -311,10 +681,13 @@ class pipeline_PBTFactory(Pipeline):
             ```
             """
         )
+        group = self.cut_data.group
+        if group is not None and group.instance_strategy:
+            prompt += f"Instances of `{group.classname}` are drawn with `draw(instance_strategy())`, it is already defined as:\n```python\n{group.instance_strategy}\n```\nUse it to create the instance, do not define it again.\n"
         mm.add_user_message(prompt)
         msg = self.chat.ask(mm, "create_strategy")
         mm.add_assistant_message(msg)
-        if count_code(msg) != 1:
+        if extract_code(msg, STRATEGY_NAMES) is None:
             return self.ask_for_code_only(mm)
         return msg
 
@@ -325,17 +698,21 @@ class pipeline_PBTFactory(Pipeline):
                 "import warnings\nfrom hypothesis.errors import NonInteractiveExampleWarning\nwarnings.filterwarnings('ignore', category=NonInteractiveExampleWarning)\nwarnings.filterwarnings('ignore', category=DeprecationWarning)\n"
             )
             f.write("import hypothesis.strategies as st\n")
-            for line in code.split("\n"):
-                if "import" in line and self.import_name in line:
-                    line = f"from {self.cut_data.cut.module} import {self.import_name}"
-                f.write(line + "\n")
+            f.write(self.normalize_code(code) + "\n")
             f.write("\n\n\n")
-            f.write("for _ in range(100):\n    strategy_function().example()\n")
+            # progress output lets run_code stop a strategy that stalls
+            f.write(
+                "for _ in range(100):\n    strategy_function().example()\n    print('.', end='', flush=True)\n"
+            )
+        err = self.check_generated_code(filename, require_strategy=True)
+        if err:
+            return 1, "", err
         exit_code, logs, logs_err, time_taken = run_code(
             filename,
             self.cut_data.project_path,
             timeout_msg=f"Strategy timeout. {self.cut_data.cut.id}",
             log_path=self.cut_data.logdir,
+            stall_timeout=STALL_TIMEOUT if self.adaptive_timeouts else None,
         )
         return exit_code, logs, logs_err
 
@@ -345,6 +722,7 @@ class pipeline_PBTFactory(Pipeline):
         code_explanation,
         property_dict,
         strategy_msg,
+        confirmed=False,
     ) -> bool:
         prompt = create_ask_properties_prompt(
             self.cut_data.cut.entry_point,
@@ -357,7 +735,7 @@ class pipeline_PBTFactory(Pipeline):
         msg = self.chat.ask(mm, f"create_pbt_{property_dict['name']}")
         mm.add_assistant_message(msg)
 
-        if not self.ask_to_confirm_has_property(
+        if not confirmed and not self.ask_to_confirm_has_property(
             mm.copy(), code_explanation, property_dict
         ):
             return False, False
@@ -368,25 +746,36 @@ class pipeline_PBTFactory(Pipeline):
         for i in range(self.max_retry):
             mm2 = mm.copy()
             bug_free, test_msg, logs, err = self.ask_to_create_pbt_with_property(
-                mm2, property_dict, find_code(strategy_msg)
+                mm2, property_dict, find_code(strategy_msg, STRATEGY_NAMES)
             )
             if bug_free:
                 break
+            if self.triage_policy == "abandon" and self.should_stop_fixing(err):
+                # each retry asks for a test and then for up to max_fix fixes
+                retries_left = self.max_retry - i - 1
+                self.record_triage(
+                    property_dict["name"],
+                    abandoned=1,
+                    llm_calls_saved=retries_left * (1 + self.max_fix),
+                )
+                break
+        if self.triage_policy != "off":
+            self.record_triage(property_dict["name"], properties=1)
         return True, bug_free
 
     def ask_to_confirm_has_property(
         self, mm: MessageManager, code_explanation, property_dict
     ) -> bool:
-        prompt = "You are correct. Base on your explanation, do you think this property is present in the function? Write **NO** if this property is not present. Else **YES**. Do not write other than **YES** or **NO**."
+        prompt = 'You are correct. Base on your explanation, do you think this property is present in the function? Answer in JSON only: {"has_property": false} if this property is not present. Else {"has_property": true}.'
         mm.add_user_message(prompt)
-        msg = self.chat.ask(
+        data = self.chat.ask(
             mm,
             f"create_pbt_{property_dict['name']}_check",
             request_type=RequestType.short_answer,
+            output_schema=HAS_PROPERTY_SCHEMA,
         )
-        if "no" in msg.lower():
-            return False
-        return True
+        # without a valid answer the property is tested
+        return data is None or data["has_property"]
 
     def ask_to_create_pbt_with_property(
         self, mm: MessageManager, property_dict, strategy_code
@@ -400,11 +789,14 @@ class pipeline_PBTFactory(Pipeline):
         mm_backup = mm.copy()
         bug_free = False
 
-        exit_code, logs, logs_err = self.test_pbts(
-            pbt_save_path,
-            self.cut_data.cut.function_body,
-            strategy_code,
-            find_code(msg),
+        def run(code):
+            return self.test_pbts(
+                pbt_save_path, self.cut_data.cut.function_body, strategy_code, code
+            )
+
+        code = find_code(msg, TEST_NAMES)
+        exit_code, logs, logs_err, code = self.repair_and_rerun(
+            mm_backup, code, run(code), run
         )
         if exit_code == 0:
             bug_free = True
@@ -412,6 +804,13 @@ class pipeline_PBTFactory(Pipeline):
         for i in range(max_fix):
             if bug_free:
                 break
+            if self.should_stop_fixing(logs_err):
+                self.record_triage(
+                    property_dict["name"],
+                    semantic_failures=1,
+                    llm_calls_saved=max_fix - i,
+                )
+                break
             msg = self.ask_fix_code(
                 mm_backup,
                 logs_err,
@@ -428,17 +827,18 @@ class pipeline_PBTFactory(Pipeline):
                     """
                 ),
                 f"fix_code_pbt_{property_dict['name']}",
+                TEST_NAMES,
             )
-            exit_code, logs, logs_err = self.test_pbts(
-                pbt_save_path,
-                self.cut_data.cut.function_body,
-                strategy_code,
-                find_code(msg),
+            code = find_code(msg, TEST_NAMES)
+            exit_code, logs, logs_err, code = self.repair_and_rerun(
+                mm_backup, code, run(code), run
             )
             if exit_code == 0:
                 bug_free = True
 
         if bug_free:
+            if self.incremental_eval:
+                self.stream_eval(pbt_save_path)
             return True, msg, logs, ""
         else:
             with open(pbt_save_path) as f:
@@ -488,7 +888,7 @@ class pipeline_PBTFactory(Pipeline):
             mm, f"create_test_{property_dict['name']}".replace(" ", "_")
         )
         mm.add_assistant_message(msg)
-        if count_code(msg) != 1:
+        if extract_code(msg, TEST_NAMES) is None:
             return self.ask_for_code_only(mm)
         return msg
 
@@ -506,28 +906,29 @@ class pipeline_PBTFactory(Pipeline):
             f.write("import pytest\n")
             f.write(f"from {self.cut_data.cut.module} import {self.import_name}\n")
 
-            for line in strategy_code.split("\n"):
-                if "import" in line and self.import_name in line:
-                    line = f"from {self.cut_data.cut.module} import {self.import_name}"
-                f.write(line + "\n")
+            f.write(self.normalize_code(strategy_code) + "\n")
             f.write("\n#END STRATEGY\n\n\n")
 
-            for line in pbt_code.split("\n"):
-                if "import" in line and self.import_name in line:
-                    line = f"from {self.cut_data.cut.module} import {self.import_name}"
-                elif "@settings(max_examples=" in line:
-                    continue
-                elif "import strategy_function" in line:
-                    continue
-                f.write(line + "\n")
-
-        for i in range(4):  # try 4 times to ensure the test is not flaky
-            exit_code, logs, logs_err, time_taken, timeouted = run_pytest(
-                filename,
-                self.cut_data.project_path,
-                self.cut_data.logdir,
-                timeout_msg=f"PBTs timeout. {self.cut_data.cut.id}, {filename}",
+            pbt_code = self.normalize_code(
+                pbt_code, drop_names=STRATEGY_NAMES, drop_max_examples=True
             )
-            if exit_code != 0:
-                return exit_code, logs, logs_err
+            f.write(pbt_code + "\n")
+
+        err = self.check_generated_code(
+            filename, require_strategy=True, require_test=True, require_given=True
+        )
+        if err:
+            return 1, "", err
+
+        # run 4 times in one container to ensure the test is not flaky
+        exit_code, logs, logs_err, time_taken, timeouted = run_pytest(
+            filename,
+            self.cut_data.project_path,
+            self.cut_data.logdir,
+            timeout_msg=f"PBTs timeout. {self.cut_data.cut.id}, {filename}",
+            repeat=4,
+            timeout=self.pytest_timeout(filename, repeat=4),
+        )
+        if exit_code == 0:
+            self.record_test_duration(filename, time_taken / 4)
         return exit_code, logs, logs_err
@@ -1,9 +1,27 @@
-import json
 import os
 import textwrap
 
-from PBTFactory.message import MessageManager, count_code, find_code
+from PBTFactory.message import MessageManager
 from PBTFactory.pipeline_PBTFactory import *
+from PBTFactory.structured_output import validate_json
+
+PROPERTY_SCHEMA = {
+    "type": "object",
+    "properties": {"name": {"type": "string"}, "explain": {"type": "string"}},
+    "required": ["name", "explain"],
+}
+# An object, servers only constrain their output to object schemas
+PROPERTY_LIST_SCHEMA = {
+    "type": "object",
+    "properties": {"properties": {"type": "array", "items": PROPERTY_SCHEMA}},
+    "required": ["properties"],
+}
+# Entries are checked one by one, a malformed one does not reject the others
+PROPERTY_LIST_VALIDATION_SCHEMA = {
+    "type": "object",
+    "properties": {"properties": {"type": "array", "items": {"type": "object"}}},
+    "required": ["properties"],
+}
 
 
 def create_ask_property_prompt(
@@ -26,36 +44,13 @@ def create_ask_property_prompt(
         What are some properties you would like to test for this function? Max 3 properties.
         return a list of properties in the json format of"""
         ).format(function_name, function, class_structure, test)
-        + ' ```[\{ "name": _, "explain": _\}, \{...\}]```\n'
+        + ' ```\{"properties": [\{ "name": _, "explain": _\}, \{...\}]\}```\n'
     )
     return template
 
 
 class pipeline_PBTFactory_no_expert_knowledge(pipeline_PBTFactory):
 
-    def get_property_list_from_msg(self, msg):
-        if count_code(msg) == 0:
-            return []
-        else:
-            code = find_code(msg)
-            try:
-                properties = json.loads(code)
-            except json.JSONDecodeError:
-                return []
-            result = []
-            for prop in properties:
-                r = {}
-                if "name" in prop or "Name" in prop:
-                    r["name"] = prop.get("name", prop.get("Name"))
-                else:
-                    continue
-                if "explain" in prop or "Explain" in prop:
-                    r["explain"] = prop.get("explain", prop.get("Explain"))
-                else:
-                    continue
-                result.append(r)
-            return result
-
     def get_property_list(self, code_explanation, retry=3):
         mm = MessageManager()
         mm.add_user_message(
@@ -67,17 +62,19 @@ class pipeline_PBTFactory_no_expert_knowledge(pipeline_PBTFactory):
             )
         )
 
-        msg = self.chat.ask(mm, "ask_property_list")
-        mm.add_assistant_message(msg)
-
-        properties = self.get_property_list_from_msg(msg)
-
+        data = self.chat.ask(
+            mm,
+            "ask_property_list",
+            output_schema=PROPERTY_LIST_SCHEMA,
+            validation_schema=PROPERTY_LIST_VALIDATION_SCHEMA,
+        )
+        properties = [
+            p
+            for p in (data or {}).get("properties", [])
+            if not validate_json(p, PROPERTY_SCHEMA)
+        ]
         if not properties:
-            mm.add_user_message(
-                "The input is not a valid json format. Please return in json."
-            )
-            msg = self.chat.ask(mm, "ask_property_list_json")
-            properties = self.get_property_list_from_msg(msg)
-            if not properties and retry > 0:
+            if retry > 0:
                 return self.get_property_list(code_explanation, retry - 1)
-        return properties
+            return []
+        return [{"name": p["name"], "explain": p["explain"]} for p in properties]
@@ -21,6 +21,33 @@ class PipelineFactory:
         self.pipeline_type = pipeline_type
         self.config = config
 
+    def eval_kwargs(self) -> dict:
+        return {
+            "eval_hypothesis_examples": self.config.get(
+                "eval_hypothesis_examples", self.config["max_hypothesis_examples"]
+            ),
+            "eval_hypothesis_shrink": self.config.get("eval_hypothesis_shrink", False),
+            "test_order": self.config.get("test_order", "mutant"),
+            "kill_history_dir": self.config.get("kill_history_dir", ""),
+            "baseline_dir": self.config.get("baseline_dir", ""),
+            "eval_tmpfs_mb": self.config.get("eval_tmpfs_mb", 0),
+            "incremental_eval": self.config.get("incremental_eval", False),
+            "early_stop_score": self.config.get("early_stop_score", 0),
+            "adaptive_timeouts": self.config.get("adaptive_timeouts", True),
+            "dedup_tests": self.config.get("dedup_tests", False),
+            "kill_matrix": self.config.get("kill_matrix", "first_kill"),
+            "static_check": self.config.get("static_check", True),
+            "auto_repair": self.config.get("auto_repair", True),
+            "triage_policy": self.config.get("triage_policy", "off"),
+            "fix_error_tokens": self.config.get("fix_error_tokens", 0),
+            "batch_property_check": self.config.get("batch_property_check", False),
+            "strategy_synthesis": self.config.get("strategy_synthesis", False),
+            "strategy_store_dir": self.config.get("strategy_store_dir", ""),
+            "explanation_cache": self.config.get("explanation_cache", "off"),
+            "explanation_cache_dir": self.config.get("explanation_cache_dir", ""),
+            "explanation_cache_tag": self.config.get("explanation_cache_tag", ""),
+        }
+
     def create(self, cut_data: CUT_data) -> IPipeline:
         if self.pipeline_type == "pipeline_unit_test_baseline":
             return pipeline_unit_test_baseline(
@@ -29,6 +56,7 @@ class PipelineFactory:
                 max_fix=self.config["max_fix"],
                 max_hypothesis_examples=self.config["max_hypothesis_examples"],
                 system_message=self.system_message,
+                **self.eval_kwargs(),
             )
 
         if self.pipeline_type == "pipeline_pbt_baseline":
@@ -38,6 +66,7 @@ class PipelineFactory:
                 max_fix=self.config["max_fix"],
                 max_hypothesis_examples=self.config["max_hypothesis_examples"],
                 system_message=self.system_message,
+                **self.eval_kwargs(),
             )
 
         if self.pipeline_type == "pipeline_PBTFactory":
@@ -51,6 +80,7 @@ class PipelineFactory:
                 max_strategy_fix=self.config["max_strategy_fix"],
                 max_hypothesis_examples=self.config["max_hypothesis_examples"],
                 system_message=self.system_message,
+                **self.eval_kwargs(),
             )
 
         if self.pipeline_type == "pipeline_PBTFactory_no_expert_knowledge":
@@ -64,6 +94,7 @@ class PipelineFactory:
                 max_strategy_fix=self.config["max_strategy_fix"],
                 max_hypothesis_examples=self.config["max_hypothesis_examples"],
                 system_message=self.system_message,
+                **self.eval_kwargs(),
             )
 
         raise ValueError(f"Invalid pipeline type: {self.pipeline_type}")
@@ -5,7 +5,7 @@ from PBTFactory.chat import Chat
 from PBTFactory.cut_data import CUT_data
 from PBTFactory.eval_code import run_pytest
 from PBTFactory.message import MessageManager, find_code
-from PBTFactory.pipeline import Pipeline
+from PBTFactory.pipeline import TEST_NAMES, Pipeline
 
 
 class pipeline_unit_test_baseline(Pipeline):
@@ -44,13 +44,23 @@ class pipeline_unit_test_baseline(Pipeline):
         msg = self.chat.ask(mm, "create_unit")
         mm.add_assistant_message(msg)
         filename = os.path.join(self.cut_data.testdir, "test_unit.py")
-        exit_code, logs, logs_err = self.test_pbts(find_code(msg), filename)
+        exit_code, logs, logs_err = self.test_pbts(
+            find_code(msg, TEST_NAMES), filename
+        )
 
         for i in range(self.max_fix):
             if exit_code == 0:
                 break
-            msg = self.ask_fix_code(mm, logs_err, extra_msg="", step_name="fix_test")
-            exit_code, logs, logs_err = self.test_pbts(find_code(msg), filename)
+            msg = self.ask_fix_code(
+                mm,
+                logs_err,
+                extra_msg="",
+                step_name="fix_test",
+                required_names=TEST_NAMES,
+            )
+            exit_code, logs, logs_err = self.test_pbts(
+                find_code(msg, TEST_NAMES), filename
+            )
         if exit_code != 0:
             os.remove(filename)
         return exit_code == 0, logs, logs_err
@@ -64,15 +74,19 @@ class pipeline_unit_test_baseline(Pipeline):
             f.write("import pytest\n")
             f.write(f"from {self.cut_data.cut.module} import {self.import_name}\n")
 
-            for line in code.split("\n"):
-                if "import" in line and self.import_name in line:
-                    line = f"from {self.cut_data.cut.module} import {self.import_name}"
-                f.write(line + "\n")
+            f.write(self.normalize_code(code) + "\n")
+
+        err = self.check_generated_code(filename, require_test=True)
+        if err:
+            return 1, "", err
 
         exit_code, logs, logs_err, time_taken, timeouted = run_pytest(
             filename,
             self.cut_data.project_path,
             self.cut_data.logdir,
             timeout_msg=f"PBTs timeout. {self.cut_data.cut.id}, {filename}",
+            timeout=self.pytest_timeout(filename),
         )
+        if exit_code == 0:
+            self.record_test_duration(filename, time_taken)
         return exit_code, logs, logs_err
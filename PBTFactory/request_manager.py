@@ -9,6 +9,13 @@ from enum import Enum
 
 from openai import OpenAI
 
+from PBTFactory.context_budget import fit_messages
+from PBTFactory.tokens import count_message_tokens
+
+# Ways a server can constrain its output to JSON, "" if it cannot
+STRUCTURED_OUTPUT_MODES = ["", "json_schema", "json_object"]
+CONTINUE_PROMPT = "Your answer was cut off. Continue exactly where it stopped, do not repeat anything and do not add an introduction."
+
 
 class RequestType(Enum):  #  This is for API cost saving
     short_answer = "short_answer"
@@ -38,7 +45,9 @@ class RequestManager:
     _lock = threading.Lock()
     stop = False
     verbose = False
+    max_continuations = 2
     waitings: dict[RequestType, queue.PriorityQueue]
+    prompt_budgets: dict[RequestType, int]
 
     @classmethod
     def init(cls, config):
@@ -46,7 +55,9 @@ class RequestManager:
             assert cls._instance is None, "RequestManager is a singleton"
             cls._instance = super(RequestManager, cls).__new__(cls)
             cls._instance.waitings = {}
+            cls._instance.prompt_budgets = {}
             for llm_server_config in config["llm_servers"]:
+                cls._instance.add_prompt_budget(llm_server_config)
                 llm_server = OpenAI(
                     api_key=llm_server_config["api_key"],
                     base_url=llm_server_config["base_url"],
@@ -59,6 +70,8 @@ class RequestManager:
                             llm_server_config["model"],
                             llm_server_config["allow_request_type"],
                             llm_server_config["retry"],
+                            llm_server_config["max_tokens"],
+                            llm_server_config["structured_output"],
                         ),
                     ).start()
         return cls._instance
@@ -67,6 +80,24 @@ class RequestManager:
         assert cls._instance is not None, "RequestManager is not initialized"
         return cls._instance
 
+    def add_prompt_budget(self, llm_server_config):
+        """
+        Prompt tokens that fit in the context window of the server with room for
+        the answer. A request may go to any server that allows its type, so the
+        budget of a type is the smallest one of these servers.
+        """
+        if not llm_server_config["num_ctx"]:
+            return
+        budget = llm_server_config["num_ctx"] - llm_server_config["max_tokens"]
+        for request_type in llm_server_config["allow_request_type"]:
+            if request_type in self.prompt_budgets:
+                budget = min(budget, self.prompt_budgets[request_type])
+            self.prompt_budgets[request_type] = budget
+
+    def get_prompt_budget(self, request_type: RequestType) -> T.Optional[int]:
+        """None if the context window of the servers is not known."""
+        return self.prompt_budgets.get(request_type)
+
     def add(self, request, rank, request_type: RequestType):
         item = PrioritizedItem(rank, request)
         if request_type in self.waitings:
@@ -75,7 +106,15 @@ class RequestManager:
             self.waitings[request_type] = queue.PriorityQueue()
             self.waitings[request_type].put(item)
 
-    def run(self, llm_server, model, allow_request_types: T.List[RequestType], retry):
+    def run(
+        self,
+        llm_server,
+        model,
+        allow_request_types: T.List[RequestType],
+        retry,
+        max_tokens=8 * 1024,
+        structured_output="",
+    ):
         should_pause = False
         last_time_log_pause = 0
         last_time_log_waiting = 0
@@ -102,7 +141,15 @@ class RequestManager:
                 continue
 
             try:
-                self.process_request(item.item, llm_server, model, retry)
+                self.process_request(
+                    item.item,
+                    llm_server,
+                    model,
+                    retry,
+                    max_tokens,
+                    structured_output,
+                    self.get_prompt_budget(request_type),
+                )
                 last_time_log_waiting = time.time()
             except Exception as e:
                 logging.error(f"Request failed: {e}", exc_info=True)
@@ -120,29 +167,87 @@ class RequestManager:
                         logging.info("Paused" if should_pause else "Resumed")
         return should_pause
 
-    def process_request(self, request, llm_server, model, retry=5):
+    def process_request(
+        self,
+        request,
+        llm_server,
+        model,
+        retry=5,
+        max_tokens=8 * 1024,
+        structured_output="",
+        prompt_budget=None,
+    ):
         try:
             t0 = time.time()
-            chat_completion = llm_server.chat.completions.create(
-                model=model, max_tokens=8 * 1024, messages=request["messages"]
+            msg = self.complete(
+                request, llm_server, model, max_tokens, structured_output, prompt_budget
             )
             timeused = time.time() - t0
-            # completion_tokens = chat_completion.usage.completion_tokens
 
             if self.verbose:
                 logging.info(f"Request: {request['info']}")
 
-            request["callback"](
-                request["id"], chat_completion.choices[0].message.content, timeused
-            )
+            request["callback"](request["id"], msg, timeused)
         except Exception as e:
             logging.warning(f"Request failed: {e}, retrying {retry} times")
             if retry > 0:
                 time.sleep(600)
-                return self.process_request(request, llm_server, model, retry - 1)
+                return self.process_request(
+                    request,
+                    llm_server,
+                    model,
+                    retry - 1,
+                    max_tokens,
+                    structured_output,
+                    prompt_budget,
+                )
             else:
                 raise e
 
+    def complete(
+        self,
+        request,
+        llm_server,
+        model,
+        max_tokens,
+        structured_output="",
+        prompt_budget=None,
+    ):
+        """
+        Answer of the server to the messages of the request. An answer cut off
+        at max_tokens is continued up to max_continuations times, the parts are
+        joined. A continuation resends the partial answer, old fix turns are
+        dropped to fit it in prompt_budget, it stops if it still does not fit.
+        """
+        messages = request["messages"]
+        kwargs = get_response_format(request.get("output_schema"), structured_output)
+        msg = ""
+        for i in range(self.max_continuations + 1):
+            chat_completion = llm_server.chat.completions.create(
+                model=model, max_tokens=max_tokens, messages=messages, **kwargs
+            )
+            # completion_tokens = chat_completion.usage.completion_tokens
+            choice = chat_completion.choices[0]
+            msg = join_continuation(msg, choice.message.content or "")
+            if choice.finish_reason != "length" or i == self.max_continuations:
+                break
+            if self.verbose:
+                logging.info(f"Continuing truncated answer: {request['info']}")
+            messages = request["messages"] + [
+                {"role": "assistant", "content": msg},
+                {"role": "user", "content": CONTINUE_PROMPT},
+            ]
+            if prompt_budget is not None:
+                messages, _ = fit_messages(messages, prompt_budget)
+                if count_message_tokens(messages) > prompt_budget:
+                    logging.warning(
+                        f"Not continuing truncated answer, the prompt exceeds {prompt_budget} tokens: {request['info']}"
+                    )
+                    break
+            # a continuation is the rest of the JSON, not a document of its own
+            kwargs = {}
+        return msg
+
     def log_status_pause(self, last_time_log_pause):
         if time.time() - last_time_log_pause > 600:
             if self.verbose:
@@ -156,3 +261,46 @@ class RequestManager:
                 logging.info("Waiting for request")
             last_time_log_waiting = time.time()
         return last_time_log_waiting
+
+
+def join_continuation(msg, continuation):
+    """
+    Append the continuation of a cut off answer. A code block that was open
+    at the cut is not opened again, and a repeated incomplete last line is
+    replaced.
+    """
+    if not msg:
+        return continuation
+    if msg.count("```") % 2 == 1 and continuation.lstrip().startswith("```"):
+        first_line, _, rest = continuation.lstrip().partition("\n")
+        if first_line.strip("`").strip().isalnum() or first_line.strip() == "```":
+            continuation = rest
+    last_line = msg.rsplit("\n", 1)[-1]
+    if last_line.strip() and continuation.lstrip().startswith(last_line.strip()):
+        msg = msg[: len(msg) - len(last_line)]
+        continuation = continuation[len(continuation) - len(continuation.lstrip()) :]
+        return (
+            msg + last_line[: len(last_line) - len(last_line.lstrip())] + continuation
+        )
+    return msg + continuation
+
+
+def get_response_format(output_schema, structured_output) -> dict:
+    """
+    Arguments of the request that constrain the answer to the schema. Servers
+    only accept an object at the top level; other schemas are validated by
+    Chat alone. Ollama's OpenAI compatible API passes json_schema on as the
+    `format` of the model.
+    """
+    if output_schema is None or output_schema.get("type") != "object":
+        return {}
+    if structured_output == "json_schema":
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "answer", "schema": output_schema},
+            }
+        }
+    if structured_output == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
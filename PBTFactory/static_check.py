@@ -0,0 +1,213 @@
+import ast
+import builtins
+import os
+import symtable
+
+from PBTFactory.dedup import get_tests
+
+# Defined in every module without an assignment
+MODULE_NAMES = {
+    "__name__",
+    "__file__",
+    "__doc__",
+    "__spec__",
+    "__loader__",
+    "__package__",
+    "__builtins__",
+    "__annotations__",
+}
+
+
+def format_error(filename, lines, lineno, error):
+    msg = f'  File "{os.path.basename(filename)}", line {lineno}\n'
+    if 0 < lineno <= len(lines):
+        msg += f"    {lines[lineno - 1].strip()}\n"
+    return msg + error
+
+
+def find_module_file(project_path, module):
+    """Source file of `module` in the project, None if it is not found."""
+    parts = module.split(".")
+    for root in [project_path, os.path.join(project_path, "src")]:
+        path = os.path.join(root, *parts)
+        if os.path.isfile(path + ".py"):
+            return path + ".py"
+        if os.path.isfile(os.path.join(path, "__init__.py")):
+            return os.path.join(path, "__init__.py")
+    return None
+
+
+def get_bound_names(stmts) -> set:
+    """Names bound at the top level of a module, including conditional blocks."""
+    names = set()
+    for node in stmts:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for n in ast.walk(target):
+                    if isinstance(n, ast.Name):
+                        names.add(n.id)
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            names |= {n.id for n in ast.walk(node.target) if isinstance(n, ast.Name)}
+        elif isinstance(node, (ast.With, ast.AsyncWith)):
+            for item in node.items:
+                if item.optional_vars is not None:
+                    names |= {
+                        n.id
+                        for n in ast.walk(item.optional_vars)
+                        if isinstance(n, ast.Name)
+                    }
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        for field in ["body", "orelse", "finalbody"]:
+            names |= get_bound_names(getattr(node, field, []))
+        for handler in getattr(node, "handlers", []):
+            names |= get_bound_names(handler.body)
+    return names
+
+
+def get_module_exports(project_path, module):
+    """
+    Names that can be imported from `module`. None if they cannot be known
+    statically, e.g. the file is missing or uses `import *` or `__getattr__`.
+    """
+    path = find_module_file(project_path, module)
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            tree = ast.parse(f.read())
+    except (SyntaxError, UnicodeDecodeError, OSError):
+        return None
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and any(a.name == "*" for a in node.names):
+            return None
+    names = get_bound_names(tree.body)
+    if "__getattr__" in names:
+        return None
+    if path.endswith("__init__.py"):
+        package_dir = os.path.dirname(path)
+        for name in os.listdir(package_dir):
+            names.add(name[: -len(".py")] if name.endswith(".py") else name)
+    return names
+
+
+def find_undefined_names(code, filename) -> set:
+    top = symtable.symtable(code, filename, "exec")
+    defined = set(dir(builtins)) | MODULE_NAMES
+    referenced = set()
+
+    def visit(table):
+        for sym in table.get_symbols():
+            name = sym.get_name()
+            if table is top or sym.is_declared_global():
+                if sym.is_assigned() or sym.is_imported() or sym.is_namespace():
+                    defined.add(name)
+            if sym.is_referenced() and sym.is_global():
+                referenced.add(name)
+        for child in table.get_children():
+            visit(child)
+
+    visit(top)
+    return referenced - defined
+
+
+def is_given_strategy_function(decorator) -> bool:
+    if not isinstance(decorator, ast.Call):
+        return False
+    func = decorator.func
+    name = func.id if isinstance(func, ast.Name) else getattr(func, "attr", "")
+    if name != "given":
+        return False
+    return any(
+        isinstance(n, ast.Name) and n.id == "strategy_function"
+        for n in ast.walk(decorator)
+    )
+
+
+def check_code(
+    filename,
+    project_path,
+    module,
+    require_strategy=False,
+    require_test=False,
+    require_given=False,
+) -> str:
+    """
+    Check a generated file without running it: syntax, undefined names, imports
+    from the module under test, and the presence of `strategy_function` and of
+    tests decorated with `@given(strategy_function())`.
+    Returns the errors in the form of a Python error message, "" if there is none.
+    """
+    with open(filename) as f:
+        code = f.read()
+    lines = code.split("\n")
+    try:
+        tree = ast.parse(code, filename)
+    except SyntaxError as e:
+        return format_error(filename, lines, e.lineno or 0, f"SyntaxError: {e.msg}")
+
+    errors = []
+    functions = [
+        node
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    ]
+    if require_strategy and not any(f.name == "strategy_function" for f in functions):
+        errors.append(
+            "NameError: `strategy_function` is not defined. The strategy function must be named `strategy_function`."
+        )
+    # methods of test classes (e.g. unittest.TestCase) are tests too
+    tests = [function for _, function in get_tests(tree)]
+    if require_test and not tests:
+        errors.append(
+            "No tests found. The name of test functions must start with `test`."
+        )
+    elif require_given and not any(
+        is_given_strategy_function(d) for t in tests for d in t.decorator_list
+    ):
+        errors.append("The tests must use the `@given(strategy_function())` decorator.")
+
+    exports = get_module_exports(project_path, module)
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ImportFrom) or node.level or exports is None:
+            continue
+        if node.module != module:
+            continue
+        for alias in node.names:
+            if alias.name != "*" and alias.name not in exports:
+                errors.append(
+                    format_error(
+                        filename,
+                        lines,
+                        node.lineno,
+                        f"ImportError: cannot import name '{alias.name}' from '{module}'",
+                    )
+                )
+
+    star_import = any(
+        isinstance(node, ast.ImportFrom) and any(a.name == "*" for a in node.names)
+        for node in ast.walk(tree)
+    )
+    undefined = set() if star_import else find_undefined_names(code, filename)
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Name)
+            and isinstance(node.ctx, ast.Load)
+            and node.id in undefined
+        ):
+            errors.append(
+                format_error(
+                    filename,
+                    lines,
+                    node.lineno,
+                    f"NameError: name '{node.id}' is not defined",
+                )
+            )
+            undefined.remove(node.id)
+    return "\n\n".join(errors)
@@ -0,0 +1,100 @@
+import ast
+import fcntl
+import hashlib
+import json
+import os
+import textwrap
+import typing as T
+
+from PBTFactory.code_under_test import code_under_test
+
+HIT = "hit"
+MISS = "miss"
+INVALID = "invalid"  # stored, but it failed the validation
+
+
+def strip_docstrings(tree):
+    for node in ast.walk(tree):
+        if isinstance(
+            node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+        ):
+            if ast.get_docstring(node, clean=False) is not None:
+                node.body = node.body[1:] or [ast.Pass()]
+    return tree
+
+
+def normalize_source(code) -> str:
+    """The AST of code without docstrings, comments and formatting."""
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError:
+        return " ".join(code.split())
+    return ast.dump(strip_docstrings(tree))
+
+
+def fingerprint(cut: code_under_test) -> str:
+    """
+    Key of a function in the store: its module, entry point, signature and the
+    normalised AST of its body. The strategy imports from the module, so the
+    same code under another module name has another key.
+    """
+    parts = [
+        cut.module or "",
+        cut.entry_point,
+        " ".join(cut.signature.split()),
+        normalize_source(cut.function_body),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def load_strategy(store_dir, key) -> T.Optional[str]:
+    path = os.path.join(store_dir, f"{key}.py")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
+
+
+def save_strategy(store_dir, key, code):
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, f"{key}.py")
+    with open(path + ".tmp", "w") as f:
+        f.write(code)
+    os.replace(path + ".tmp", path)
+
+
+def remove_strategy(store_dir, key):
+    path = os.path.join(store_dir, f"{key}.py")
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def update_store_stats(store_dir, lookup, stored):
+    """Add a lookup (HIT, MISS or INVALID) to the stats of the store."""
+    os.makedirs(store_dir, exist_ok=True)
+    stats_path = os.path.join(store_dir, "stats.json")
+    with open(stats_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stats = {HIT: 0, MISS: 0, INVALID: 0, "stored": 0}
+        if os.path.exists(stats_path):
+            with open(stats_path) as f:
+                stats = json.load(f)
+        stats[lookup] += 1
+        stats["stored"] += int(stored)
+        with open(stats_path + ".tmp", "w") as f:
+            json.dump(stats, f, indent=4)
+        os.replace(stats_path + ".tmp", stats_path)
+
+
+def summarize_store(logdirs) -> dict:
+    """Lookups of a run, from the strategy_store.json of each CUT."""
+    summary = {HIT: 0, MISS: 0, INVALID: 0, "stored": 0}
+    for logdir in logdirs:
+        path = os.path.join(logdir, "strategy_store.json")
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            result = json.load(f)
+        summary[result["lookup"]] += 1
+        summary["stored"] += int(result["stored"])
+    return summary
@@ -0,0 +1,198 @@
+import ast
+import textwrap
+import typing as T
+
+# Strategies of builtin types, the arguments are the strategies of their items
+TYPE_STRATEGIES = {
+    "int": "st.integers()",
+    "float": "st.floats(allow_nan=False, allow_infinity=False)",
+    "complex": "st.complex_numbers(allow_nan=False, allow_infinity=False)",
+    "str": "st.text()",
+    "bytes": "st.binary()",
+    "bool": "st.booleans()",
+    "None": "st.none()",
+    "NoneType": "st.none()",
+}
+SEQUENCE_TYPES = {
+    "list": "st.lists({})",
+    "List": "st.lists({})",
+    "Sequence": "st.lists({})",
+    "Iterable": "st.lists({})",
+    "Collection": "st.lists({})",
+    "set": "st.sets({})",
+    "Set": "st.sets({})",
+    "frozenset": "st.frozensets({})",
+    "FrozenSet": "st.frozensets({})",
+}
+MAPPING_TYPES = {"dict", "Dict", "Mapping"}
+TUPLE_TYPES = {"tuple", "Tuple"}
+MAX_LITERALS = 20
+
+
+def get_annotation_name(node) -> str:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Constant) and node.value is None:
+        return "None"
+    return ""
+
+
+def strategy_from_annotation(node) -> T.Optional[str]:
+    """Strategy for a type annotation of builtin and typing types, None otherwise."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        try:
+            node = ast.parse(node.value, mode="eval").body
+        except SyntaxError:
+            return None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        left = strategy_from_annotation(node.left)
+        right = strategy_from_annotation(node.right)
+        if left is None or right is None:
+            return None
+        return f"st.one_of({left}, {right})"
+
+    if not isinstance(node, ast.Subscript):
+        return TYPE_STRATEGIES.get(get_annotation_name(node))
+
+    name = get_annotation_name(node.value)
+    args = node.slice.elts if isinstance(node.slice, ast.Tuple) else [node.slice]
+    if name == "Optional":
+        inner = strategy_from_annotation(args[0])
+        return None if inner is None else f"st.one_of(st.none(), {inner})"
+    strategies = [strategy_from_annotation(arg) for arg in args]
+    if name in TUPLE_TYPES:
+        if len(args) == 2 and isinstance(args[1], ast.Constant):
+            if args[1].value is Ellipsis and strategies[0] is not None:
+                return f"st.lists({strategies[0]}).map(tuple)"
+        if None in strategies:
+            return None
+        return f"st.tuples({', '.join(strategies)})"
+    if None in strategies:
+        return None
+    if name == "Union":
+        return f"st.one_of({', '.join(strategies)})"
+    if name in SEQUENCE_TYPES and len(strategies) == 1:
+        return SEQUENCE_TYPES[name].format(strategies[0])
+    if name in MAPPING_TYPES and len(strategies) == 2:
+        return f"st.dictionaries({strategies[0]}, {strategies[1]})"
+    return None
+
+
+def strategy_from_value(value) -> T.Optional[str]:
+    """Strategy for values of the type of a literal, None if it is not known."""
+    if value is None:
+        return None
+    if isinstance(value, (bool, int, float, complex, str, bytes)):
+        return TYPE_STRATEGIES[type(value).__name__]
+    if isinstance(value, (list, set, frozenset, tuple)):
+        items = {strategy_from_value(v) for v in value}
+        if len(items) != 1 or None in items:
+            return None
+        item = items.pop()
+        if isinstance(value, tuple):
+            return f"st.lists({item}).map(tuple)"
+        return SEQUENCE_TYPES[type(value).__name__].format(item)
+    if isinstance(value, dict) and value:
+        keys = {strategy_from_value(k) for k in value}
+        values = {strategy_from_value(v) for v in value.values()}
+        if len(keys) != 1 or len(values) != 1 or None in keys | values:
+            return None
+        return f"st.dictionaries({keys.pop()}, {values.pop()})"
+    return None
+
+
+def get_test_literals(test, function_name, params) -> T.Dict[str, list]:
+    """Literal arguments of the calls to the function in the tests, by parameter."""
+    try:
+        tree = ast.parse(textwrap.dedent(test))
+    except SyntaxError:
+        return {}
+    literals = {param: [] for param in params}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        if get_annotation_name(node.func) != function_name:
+            continue
+        arguments = list(zip(params, node.args))
+        arguments += [(k.arg, k.value) for k in node.keywords if k.arg in literals]
+        for param, arg in arguments:
+            try:
+                value = ast.literal_eval(arg)
+            except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+                continue
+            if value not in literals[param] and len(literals[param]) < MAX_LITERALS:
+                literals[param].append(value)
+    return literals
+
+
+def strategy_for_parameter(arg, default, literals) -> T.Optional[str]:
+    strategy = None
+    if arg.annotation is not None:
+        strategy = strategy_from_annotation(arg.annotation)
+    if strategy is None and default is not None:
+        try:
+            strategy = strategy_from_value(ast.literal_eval(default))
+        except (ValueError, TypeError, SyntaxError):
+            pass
+    if strategy is None:
+        types = {strategy_from_value(v) for v in literals}
+        if len(types) == 1:
+            strategy = types.pop()
+    if strategy is None:
+        return None
+    if literals:
+        # the values of the tests are tried first
+        return f"st.one_of(st.sampled_from({literals!r}), {strategy})"
+    return strategy
+
+
+def synthesize_strategy(
+    signature, entry_point, test, module, import_name
+) -> T.Optional[str]:
+    """
+    A `strategy_function` for a module level function, built from the type
+    annotations and default values of its parameters and the literal arguments
+    in its tests. None if the function is a method or the type of a parameter
+    cannot be inferred.
+    """
+    if "." in entry_point:
+        return None
+    try:
+        function = ast.parse(f"{signature.strip().rstrip(':')}:\n    pass").body[0]
+    except (SyntaxError, IndexError):
+        return None
+    if not isinstance(function, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return None
+
+    args = function.args
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + args.defaults
+    params = list(zip(positional, defaults)) + list(
+        zip(args.kwonlyargs, args.kw_defaults)
+    )
+    if not params or params[0][0].arg in ["self", "cls"]:
+        return None
+    literals = get_test_literals(test, entry_point, [a.arg for a, _ in params])
+
+    lines = []
+    for arg, default in params:
+        strategy = strategy_for_parameter(arg, default, literals.get(arg.arg, []))
+        if strategy is None:
+            return None
+        lines.append(f"    {arg.arg} = draw({strategy})")
+    names = [arg.arg for arg, _ in params]
+    if len(names) == 1:
+        lines.append(f"    return {names[0]}")
+    else:
+        lines.append(
+            "    return {" + ", ".join(f'"{name}": {name}' for name in names) + "}"
+        )
+    body = "\n".join(lines)
+    return (
+        "import hypothesis.strategies as st\n"
+        f"from {module} import {import_name}\n\n\n"
+        "@st.composite\n"
+        f"def strategy_function(draw):\n{body}\n"
+    )
@@ -0,0 +1,96 @@
+import json
+import re
+import typing as T
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "integer": int,
+    "number": (int, float),
+    "null": type(None),
+}
+
+
+def parse_json(msg: str) -> T.Any:
+    """
+    The JSON value of an answer: the whole answer, the first code block that
+    parses, or the first object or array in the text. Raises ValueError if
+    there is none.
+    """
+    try:
+        return json.loads(msg)
+    except json.JSONDecodeError:
+        pass
+    for block in re.findall(r"```(?:json)?\s*(.*?)```", msg, re.DOTALL):
+        try:
+            return json.loads(block)
+        except json.JSONDecodeError:
+            continue
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"[\[{]", msg):
+        try:
+            return decoder.raw_decode(msg, match.start())[0]
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("The answer does not contain valid JSON.")
+
+
+def validate_json(data, schema, path="$") -> T.List[str]:
+    """
+    Errors of data against a JSON schema. Supports the keywords the prompts
+    use: type, properties, required, items, enum and minItems.
+    """
+    expected = schema.get("type")
+    if expected is not None:
+        python_type = JSON_TYPES[expected]
+        is_bool = isinstance(data, bool)
+        if not isinstance(data, python_type) or (
+            is_bool and expected in ["integer", "number"]
+        ):
+            return [f"{path}: expected {expected}, got {type(data).__name__}"]
+    errors = []
+    if "enum" in schema and data not in schema["enum"]:
+        errors.append(f"{path}: {data!r} is not one of {schema['enum']}")
+    if isinstance(data, dict):
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path}: missing key {key!r}")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in data:
+                errors += validate_json(data[key], sub_schema, f"{path}.{key}")
+    if isinstance(data, list):
+        if len(data) < schema.get("minItems", 0):
+            errors.append(f"{path}: expected at least {schema['minItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(data):
+                errors += validate_json(item, schema["items"], f"{path}[{i}]")
+    return errors
+
+
+def lower_keys(data):
+    """Lower case the keys of all objects, e.g. `Name` to `name`."""
+    if isinstance(data, dict):
+        return {str(k).lower(): lower_keys(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [lower_keys(item) for item in data]
+    return data
+
+
+def parse_structured(msg: str, schema) -> T.Tuple[T.Any, T.List[str]]:
+    """The JSON of an answer and its errors against the schema."""
+    try:
+        data = lower_keys(parse_json(msg))
+    except ValueError as e:
+        return None, [str(e)]
+    errors = validate_json(data, schema)
+    return (None if errors else data), errors
+
+
+def create_fix_json_prompt(errors, schema) -> str:
+    return (
+        "The answer is not valid. Errors:\n"
+        + "\n".join(errors)
+        + f"\nReturn only JSON that follows this schema:\n```json\n{json.dumps(schema)}\n```"
+    )
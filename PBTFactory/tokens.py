@@ -0,0 +1,52 @@
+import functools
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding():
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of text. Uses tiktoken if it is installed, an estimate of
+    CHARS_PER_TOKEN characters per token otherwise. Local models use other
+    tokenizers, the count is an approximation either way.
+    """
+    if tiktoken is not None:
+        try:
+            return len(get_encoding().encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the start and the end of text, with a note of what was removed."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens, 0) * CHARS_PER_TOKEN // 2
+    removed = len(text) - 2 * keep
+    while keep > 0:
+        result = (
+            f"{text[:keep]}\n... [{removed} characters truncated] ...\n{text[-keep:]}"
+        )
+        if count_tokens(result) <= max_tokens:
+            return result
+        keep = keep * 3 // 4
+        removed = len(text) - 2 * keep
+    return f"... [{len(text)} characters truncated] ..."
+
+
+# Tokens of the chat template around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_message_tokens(messages) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
@@ -63,8 +63,13 @@ class EvalResult(IResult):
     retry_count: float = 0
     create_rate: float = 0
     aggregation_count: bool = 0
+    baseline: str = ""  # fingerprint of the shared mutant baseline
+    killed_keys: frozenset = frozenset()  # mutant keys of the baseline
+    survived_keys: frozenset = frozenset()
 
     def get_number_of_mutants(self) -> int:
+        if self.baseline:
+            return len(self.killed_keys | self.survived_keys)
         return len(self.killed_ids | self.survived_ids)
 
     def get_number_lines(self) -> int:
@@ -73,7 +78,8 @@ class EvalResult(IResult):
     def mutation_score(self) -> float:
         if self.get_number_of_mutants() == 0:
             return 0
-        return len(self.killed_ids) / self.get_number_of_mutants()
+        killed = self.killed_keys if self.baseline else self.killed_ids
+        return len(killed) / self.get_number_of_mutants()
 
     def coverage(self) -> float:
         if self.get_number_lines() == 0:
@@ -111,15 +117,24 @@ class EvalResult(IResult):
             return self
 
         assert self.get_number_lines() == other.get_number_lines()
-        assert (
-            self.get_number_of_mutants() == other.get_number_of_mutants()
-        ), f"{self.filename} {self.get_number_of_mutants()} {other.get_number_of_mutants()}"
+        assert len(self.killed_ids | self.survived_ids) == len(
+            other.killed_ids | other.survived_ids
+        ), f"{self.filename} {len(self.killed_ids | self.survived_ids)} {len(other.killed_ids | other.survived_ids)}"
+        killed_ids = self.killed_ids | other.killed_ids
+        survived_ids = self.survived_ids & other.survived_ids
+        # The mutant keys are only comparable with the same baseline, otherwise
+        # the merge falls back to the mutmut ids.
+        baseline = self.baseline if self.baseline == other.baseline else ""
+        killed_keys = survived_keys = frozenset()
+        if baseline:
+            killed_keys = self.killed_keys | other.killed_keys
+            survived_keys = (self.survived_keys | other.survived_keys) - killed_keys
 
         new_result = EvalResult(
             self.filename,
             [],
-            self.killed_ids | other.killed_ids,
-            self.survived_ids & other.survived_ids,
+            killed_ids,
+            survived_ids,
             self.executed_lines | other.executed_lines,
             self.missing_lines & other.missing_lines,
             max(self.complexity, other.complexity),
@@ -134,17 +149,36 @@ class EvalResult(IResult):
             )
             / (self.aggregation_count + other.aggregation_count),
             self.aggregation_count + other.aggregation_count,
+            baseline,
+            killed_keys,
+            survived_keys,
         )
 
         assert new_result.get_number_lines() == self.get_number_lines()
-        assert (
-            new_result.get_number_of_mutants() == self.get_number_of_mutants()
-        ), f"{new_result.get_number_of_mutants()} {self.get_number_of_mutants()}"
+        assert len(killed_ids | survived_ids) == len(
+            self.killed_ids | self.survived_ids
+        ), f"{len(killed_ids | survived_ids)} {len(self.killed_ids | self.survived_ids)}"
 
         return new_result
 
     @staticmethod
     def from_dict(data):
+        if "error_code" not in data and "baseline" in data:
+            return EvalResult(
+                data["filename"],
+                [],
+                set(data["killed_ids"] + data["suspicious_ids"]),
+                set(data["survived_ids"] + data["timeout_ids"]),
+                set(data["coverage"]["executed_lines"]),
+                set(data["coverage"]["missing_lines"]),
+                data["complexity"],
+                data["retry_count"],
+                data["create_rate"],
+                1,
+                data["baseline"],
+                frozenset(data["killed_keys"]),
+                frozenset(data["survived_keys"]),
+            )
         if "error_code" not in data:
             return EvalResult(
                 data["filename"],
@@ -5,12 +5,21 @@ import os
 
 import PBTFactory
 from PBTFactory.chat import RequestManager
+from PBTFactory.class_group import group_by_class
 from PBTFactory.cut_data import CUT_data
 from PBTFactory.get_args import get_args
 from PBTFactory.get_code_real_project import get_code_real_project, setup_for_real_project
 
 if __name__ == "__main__":
-    args = get_args()
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        "--group_by_class",
+        help="share the explanation and instance strategy of methods of a class",
+        action="store_true",
+    )
+    args = get_args(parser)
 
     if args.project_src_code == "":
         raise ValueError("Please provide the path to the project source")
@@ -19,10 +28,16 @@ if __name__ == "__main__":
 
     cut_datas = []
     for i in sorted(os.listdir(args.dataset))[:]:
-        cut = get_code_real_project(os.path.join(args.dataset, i))
+        cut = get_code_real_project(
+            os.path.join(args.dataset, i), args.test_context_tokens
+        )
         _, testdir, resultdir, logdir = setup_for_real_project(cut, args.out)
         cut_datas.append(
             CUT_data(cut, args.project_src_code, testdir, resultdir, logdir)
         )
 
+    if args.group_by_class:
+        for group in group_by_class(cut_datas):
+            logging.info(f"Class group {group}: {len(group.members)} methods")
+
     PBTFactory.main(args, cut_datas)
@@ -18,7 +18,9 @@ if __name__ == "__main__":
 
     cut_datas = []
     for folder in sorted(os.listdir(args.dataset)):
-        cut = get_code_stdlib(os.path.join(args.dataset, folder))
+        cut = get_code_stdlib(
+            os.path.join(args.dataset, folder), args.test_context_tokens
+        )
         if not args.include_test:
             cut.test = ""
         if not args.include_class_structure: